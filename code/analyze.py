@@ -0,0 +1,201 @@
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from backends import BACKENDS
+from board_tracker import BoardTracker
+from frame_source import PrefetchReader
+from inference_worker import init_pool_worker, pool_detector
+from model_registry import GRID_MODEL_PATH
+from yolo import GridDetector
+
+def split_segments(frame_count, segment_count, overlap):
+    """
+    Splits frames 1..frame_count into segment_count (start, end, warm_up)
+    ranges. Each segment starts decoding overlap frames early, so its board
+    state has settled by the time its own range begins.
+    """
+    segment_count = max(1, min(segment_count, frame_count))
+    bounds = [1 + frame_count * index // segment_count for index in range(segment_count + 1)]
+    return [
+        (start, end - 1, max(1, start - overlap))
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+
+def _analyze_segment(video_path, start, end, warm_up, options):
+    start_time = time.perf_counter()
+    cap = cv2.VideoCapture(video_path)
+    # CAP_PROP_POS_FRAMES is 0-based, frame indices are 1-based
+    cap.set(cv2.CAP_PROP_POS_FRAMES, warm_up - 1)
+
+    tracker = BoardTracker(
+        pool_detector(),
+        change_threshold=options['threshold'],
+        frames_to_skip=options['skip'],
+        decay=options['decay'],
+        confidence_weighted=options['confidence_weighted']
+    )
+
+    # Sampled frames fall on the same global stride in every segment
+    reader = PrefetchReader(cap, wanted=options['skip'] + 1, start_index=warm_up - 1, seekable=True)
+    try:
+        frames = itertools.takewhile(lambda indexed_frame: indexed_frame[0] <= end, reader)
+        changes = list(tracker.run_indexed(frames))
+    finally:
+        reader.close()
+
+    return {
+        'start': start,
+        'end': end,
+        'warm_up': warm_up,
+        'changes': changes,
+        'final_types': tracker.cell_types.tolist(),
+        'seconds': time.perf_counter() - start_time
+    }
+
+def stitch_segments(segment_results, initial_types=None):
+    """
+    Merges per-segment changes into one reveal history. Changes confirmed
+    during a segment's warm-up only rebuild state the previous segment
+    already reported, so they are dropped; changes in a segment's own range
+    are kept unless they repeat the global state at that point, which
+    happens when a reveal was confirmed just before the boundary.
+    """
+    board_types = [row[:] for row in initial_types] if initial_types else [[0] * 5 for _ in range(5)]
+    reveals = []
+    for result in sorted(segment_results, key=lambda result: result['start']):
+        for change in result['changes']:
+            if change['frame'] < result['start']:
+                continue
+            x, y = change['x'], change['y']
+            if board_types[y][x] == change['new_type']:
+                continue
+            reveals.append(dict(change, old_type=board_types[y][x]))
+            board_types[y][x] = change['new_type']
+    return reveals, board_types
+
+def analyze_video(video_path, model_path=GRID_MODEL_PATH, backend="pytorch", int8=False, workers=None,
+                  segments=None, overlap=None, threshold=3, skip=5, decay=1.0, confidence_weighted=False):
+    """
+    Processes a recorded game in parallel segments. Returns the stitched
+    reveal history and per-segment timings.
+    """
+    cap = cv2.VideoCapture(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    if frame_count <= 0:
+        raise ValueError(f"Could not read the frame count of {video_path}")
+
+    workers = max(1, workers or os.cpu_count() or 1)
+    segments = segments or workers
+    if overlap is None:
+        # Long enough to confirm every card already revealed, twice over
+        overlap = 2 * threshold * (skip + 1)
+    options = {'threshold': threshold, 'skip': skip, 'decay': decay, 'confidence_weighted': confidence_weighted}
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    # Spawn so the workers do not inherit this process's threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_pool_worker,
+                             initargs=(GridDetector, model_path, backend, int8, threads)) as executor:
+        futures = [
+            executor.submit(_analyze_segment, video_path, start, end, warm_up, options)
+            for start, end, warm_up in split_segments(frame_count, segments, overlap)
+        ]
+        segment_results = [future.result() for future in futures]
+
+    reveals, final_types = stitch_segments(segment_results)
+    for reveal in reveals:
+        reveal['time'] = round(reveal['frame'] / fps, 3)
+
+    return {
+        'video': video_path,
+        'fps': fps,
+        'frames': frame_count,
+        'reveals': reveals,
+        'final_types': final_types,
+        'segments': [
+            {key: result[key] for key in ('start', 'end', 'warm_up', 'seconds')}
+            for result in segment_results
+        ]
+    }
+
+def read_card_texts(video_path, model_path, backend, int8):
+    # Words of the first frame, read once in this process
+    from ocr_handler import OCRHandler
+
+    cap = cv2.VideoCapture(video_path)
+    ret, frame = cap.read()
+    cap.release()
+    if not ret:
+        return [[""] * 5 for _ in range(5)]
+    tracker = BoardTracker(GridDetector(model_path, backend, int8), OCRHandler())
+    tracker.initialize(frame)
+    return tracker.cell_texts
+
+def write_csv(csv_path, reveals):
+    with open(csv_path, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=['frame', 'time', 'x', 'y', 'old_type', 'new_type', 'text'])
+        writer.writeheader()
+        for reveal in reveals:
+            writer.writerow({field: reveal.get(field, "") for field in writer.fieldnames})
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a recorded game in parallel, faster than real time")
+    parser.add_argument("video", help="Recorded game video")
+    parser.add_argument("--model", default=GRID_MODEL_PATH, help="Grid detection model")
+    parser.add_argument("--backend", choices=BACKENDS, default="pytorch", help="Inference backend")
+    parser.add_argument("--int8", action="store_true", help="Use INT8 quantized weights (onnx/openvino)")
+    parser.add_argument("--workers", type=int, help="Worker processes, defaults to the CPU count")
+    parser.add_argument("--segments", type=int, help="Segments to split the video into, defaults to --workers")
+    parser.add_argument("--overlap", type=int, help="Warm-up frames decoded before each segment")
+    parser.add_argument("--threshold", type=int, default=3, help="Detections needed to confirm a change")
+    parser.add_argument("--skip", type=int, default=5, help="Frames skipped between detections")
+    parser.add_argument("--decay", type=float, default=1.0, help="Per-detection decay of pending change votes")
+    parser.add_argument("--confidence-weighted", action="store_true", help="Weight change votes by confidence")
+    parser.add_argument("--no-ocr", action="store_true", help="Skip reading the card words")
+    parser.add_argument("--output", default="analysis.json", help="JSON file for the reveal history")
+    parser.add_argument("--csv", help="Also write the reveals as CSV")
+    args = parser.parse_args()
+    if not 0 < args.decay <= 1:
+        parser.error("--decay must be greater than 0 and at most 1")
+
+    start_time = time.perf_counter()
+    try:
+        analysis = analyze_video(
+            args.video, args.model, args.backend, args.int8, args.workers, args.segments, args.overlap,
+            args.threshold, args.skip, args.decay, args.confidence_weighted
+        )
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        return
+
+    if not args.no_ocr:
+        cell_texts = read_card_texts(args.video, args.model, args.backend, args.int8)
+        analysis['cards'] = [
+            {'x': x, 'y': y, 'text': cell_texts[y][x]}
+            for y in range(5) for x in range(5) if cell_texts[y][x]
+        ]
+        for reveal in analysis['reveals']:
+            reveal['text'] = cell_texts[reveal['y']][reveal['x']]
+    elapsed = time.perf_counter() - start_time
+
+    for reveal in analysis['reveals']:
+        print(f"{reveal['time']:.1f}s (frame {reveal['frame']}): cell ({reveal['x']}, {reveal['y']}) "
+              f"{reveal['old_type']} -> {reveal['new_type']} {reveal.get('text', '')}")
+    video_seconds = analysis['frames'] / analysis['fps']
+    print(f"Analyzed {video_seconds:.0f}s of video in {elapsed:.1f}s ({video_seconds / elapsed:.1f}x real time)")
+
+    with open(args.output, 'w') as output_file:
+        json.dump(analysis, output_file, indent=2)
+    if args.csv:
+        write_csv(args.csv, analysis['reveals'])
+
+if __name__ == "__main__":
+    main()
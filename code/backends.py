@@ -0,0 +1,37 @@
+import os
+from ultralytics import YOLO
+
+BACKENDS = ("pytorch", "onnx", "openvino")
+
+def resolve_model_path(model_path, backend="pytorch", int8=False):
+    """
+    Returns where the weights of model_path live for a backend, following the
+    names export_models.py writes next to the .pt file.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}")
+
+    base_path = os.path.splitext(model_path)[0]
+    suffix = "_int8" if int8 else ""
+    if backend == "onnx":
+        return f"{base_path}{suffix}.onnx"
+    if backend == "openvino":
+        return f"{base_path}{suffix}_openvino_model"
+    if int8:
+        raise ValueError("INT8 weights are only available for the onnx and openvino backends")
+    return model_path
+
+def load_model(model_path, backend="pytorch", int8=False):
+    """
+    Loads a YOLO model for the given backend. Every backend goes through
+    ultralytics, so predictions come back as the same Results objects and the
+    detectors' post-processing is shared.
+    """
+    backend_path = resolve_model_path(model_path, backend, int8)
+    if not os.path.exists(backend_path):
+        raise FileNotFoundError(
+            f"No {backend} weights at {backend_path}, export them with: "
+            f"python code/export_models.py export {model_path} --format {backend}"
+            + (" --int8 --calibration <images>" if int8 else "")
+        )
+    return YOLO(backend_path, task="detect")
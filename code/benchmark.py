@@ -0,0 +1,327 @@
+import argparse
+import json
+import os
+import platform
+import time
+import cv2
+import numpy as np
+from backends import BACKENDS
+from board_tracker import BoardTracker, read_video_frames
+from motion import MotionGate
+from registration import BoardRegistration
+from roi import BoardROI
+from yolo import GridDetector
+
+AGENT_IMAGES = {
+    1: "resources/red_agent.png",
+    2: "resources/blue_agent.png",
+    3: "resources/innocent_bystander.png",
+    4: "resources/assassin.png"
+}
+
+SYNTHETIC_WORDS = [
+    "AGENT", "BANK", "CASINO", "DIAMOND", "EAGLE", "FIRE", "GHOST", "HOTEL",
+    "ICE", "JET", "KING", "LASER", "MOON", "NINJA", "OPERA", "PIANO",
+    "QUEEN", "ROBOT", "SPY", "TOWER", "UNICORN", "VAN", "WHALE", "YARD", "ZONE"
+]
+
+# Cards of each type on a Codenames key
+KEY_CARD_COUNTS = {1: 9, 2: 8, 3: 7, 4: 1}
+
+class SyntheticGame:
+    """
+    Procedurally generated game video: 25 codename cards on a table, agent
+    tiles composited over them at scripted times, and a jittering camera.
+    """
+    def __init__(self, width=1280, height=720, fps=30, duration=60.0, reveals=10,
+                 jitter=3.0, seed=0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frame_total = int(duration * fps)
+        self.jitter = jitter
+        self.random = np.random.default_rng(seed)
+
+        # Board layout, cards fill 90% of their cell
+        self.board_left = int(width * 0.05)
+        self.board_top = int(height * 0.05)
+        self.cell_width = (width - 2 * self.board_left) // 5
+        self.cell_height = (height - 2 * self.board_top) // 5
+        self.card_width = int(self.cell_width * 0.9)
+        self.card_height = int(self.cell_height * 0.9)
+
+        self.agent_images = {
+            card_type: cv2.resize(cv2.imread(path), (self.card_width, self.card_height), interpolation=cv2.INTER_AREA)
+            for card_type, path in AGENT_IMAGES.items()
+        }
+
+        # Reveal a random key in random order, evenly spread after a lead-in
+        key_types = [card_type for card_type, count in KEY_CARD_COUNTS.items() for _ in range(count)]
+        self.random.shuffle(key_types)
+        key = np.array(key_types).reshape(5, 5)
+        reveal_cells = self.random.permutation(25)[:reveals]
+        lead_in = min(self.frame_total // 10, 2 * fps)
+        spacing = (self.frame_total - lead_in) // (reveals + 1) if reveals else 0
+        self.events = []
+        for reveal_index, cell in enumerate(reveal_cells.tolist()):
+            x, y = cell % 5, cell // 5
+            self.events.append({
+                'frame': lead_in + spacing * (reveal_index + 1),
+                'x': x,
+                'y': y,
+                'type': int(key[y][x])
+            })
+
+    def _card_origin(self, x, y):
+        left = self.board_left + x * self.cell_width + (self.cell_width - self.card_width) // 2
+        top = self.board_top + y * self.cell_height + (self.cell_height - self.card_height) // 2
+        return left, top
+
+    def _render_board(self, cell_types):
+        board = np.full((self.height, self.width, 3), (60, 110, 50), dtype=np.uint8)
+        for y in range(5):
+            for x in range(5):
+                left, top = self._card_origin(x, y)
+                card = board[top:top + self.card_height, left:left + self.card_width]
+                if cell_types[y][x] == 0:
+                    card[:] = (225, 235, 240)
+                    word = SYNTHETIC_WORDS[y * 5 + x]
+                    scale = self.card_height / 80
+                    (text_width, text_height), _ = cv2.getTextSize(word, cv2.FONT_HERSHEY_SIMPLEX, scale, 2)
+                    cv2.putText(
+                        card, word,
+                        ((self.card_width - text_width) // 2, int(self.card_height * 0.75)),
+                        cv2.FONT_HERSHEY_SIMPLEX, scale, (20, 20, 20), 2, cv2.LINE_AA
+                    )
+                else:
+                    card[:] = self.agent_images[cell_types[y][x]]
+        return board
+
+    def ground_truth(self):
+        return {
+            'fps': self.fps,
+            'frames': self.frame_total,
+            'initial': [[0 for _ in range(5)] for _ in range(5)],
+            'events': self.events
+        }
+
+    def frames(self):
+        cell_types = [[0 for _ in range(5)] for _ in range(5)]
+        events_by_frame = {}
+        for event in self.events:
+            events_by_frame.setdefault(event['frame'], []).append(event)
+
+        board = self._render_board(cell_types)
+        offset = np.zeros(3)
+        for frame_index in range(1, self.frame_total + 1):
+            if frame_index in events_by_frame:
+                for event in events_by_frame[frame_index]:
+                    cell_types[event['y']][event['x']] = event['type']
+                board = self._render_board(cell_types)
+
+            # Camera jitter as a bounded random walk in x, y and rotation
+            offset = np.clip(offset + self.random.normal(0, self.jitter / 4, 3), -self.jitter, self.jitter)
+            transform = cv2.getRotationMatrix2D((self.width / 2, self.height / 2), offset[2] * 0.2, 1.0)
+            transform[:, 2] += offset[:2]
+            yield cv2.warpAffine(board, transform, (self.width, self.height), borderMode=cv2.BORDER_REPLICATE)
+
+def write_synthetic_video(game, video_path):
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), game.fps, (game.width, game.height))
+    for frame in game.frames():
+        writer.write(frame)
+    writer.release()
+
+    truth_path = os.path.splitext(video_path)[0] + ".json"
+    with open(truth_path, 'w') as truth_file:
+        json.dump(game.ground_truth(), truth_file, indent=2)
+    return truth_path
+
+def percentile(values, percent):
+    return float(np.percentile(values, percent)) if values else None
+
+def run_benchmark(tracker, frames, truth):
+    """
+    Drives the tracker over frames and scores it against a ground-truth event
+    log. Frame indices in the log are 1-based, as counted by the tracker.
+    """
+    fps = truth['fps']
+    truth_types = np.array(truth['initial'], dtype=np.int64)
+    events_by_frame = {}
+    for event in truth['events']:
+        events_by_frame.setdefault(event['frame'], []).append(event)
+
+    feed_times = {}
+    frame_total = 0
+    detector_frames = []
+
+    def timed_frames():
+        # With batching this runs on the tracker's feeder thread, so it only
+        # notes when each frame left the source; scoring happens below
+        nonlocal frame_total
+        for frame in frames:
+            frame_total += 1
+            feed_times[frame_total] = time.perf_counter()
+            yield frame
+
+    class CountingDetector:
+        # Counts model calls without changing what the tracker sees
+        def __init__(self, detector):
+            self.detector = detector
+
+        def process_image(self, image):
+            detector_frames.append(1)
+            return self.detector.process_image(image)
+
+        def process_batch(self, images, imgsz=None):
+            detector_frames.extend([1] * len(images))
+            return self.detector.process_batch(images, imgsz)
+
+        def predict(self, images, imgsz=None):
+            # Raw boxes, used by BoardROI on its crops
+            detector_frames.extend([1] * len(images))
+            return self.detector.predict(images, imgsz)
+
+    tracker.detector = CountingDetector(tracker.detector)
+    initial_types = np.array(tracker.cell_types)
+    confirmations = []
+    start_time = time.perf_counter()
+    for change in tracker.run(timed_frames()):
+        confirmations.append(dict(change, time=time.perf_counter()))
+    elapsed = time.perf_counter() - start_time
+    tracker.detector = tracker.detector.detector
+
+    # Score the board the tracker held after each frame, rebuilt from the
+    # confirmations it yielded
+    board_types = initial_types.copy()
+    confirmations_by_frame = {}
+    for change in confirmations:
+        confirmations_by_frame.setdefault(change['frame'], []).append(change)
+    correct_cells = 0
+    for frame_index in range(1, frame_total + 1):
+        for event in events_by_frame.get(frame_index, []):
+            truth_types[event['y']][event['x']] = event['type']
+        for change in confirmations_by_frame.get(frame_index, []):
+            board_types[change['y']][change['x']] = change['new_type']
+        correct_cells += int((board_types == truth_types).sum())
+
+    # Match each reveal with the first confirmation of its cell and type
+    unmatched = list(confirmations)
+    wall_latencies = []
+    video_latencies = []
+    missed_reveals = 0
+    for event in truth['events']:
+        match = next((
+            change for change in unmatched
+            if change['x'] == event['x'] and change['y'] == event['y']
+            and change['new_type'] == event['type'] and change['frame'] >= event['frame']
+        ), None)
+        if match is None:
+            missed_reveals += 1
+            continue
+        unmatched.remove(match)
+        wall_latencies.append(match['time'] - feed_times[event['frame']])
+        video_latencies.append((match['frame'] - event['frame']) / fps)
+
+    final_types = np.array(tracker.cell_types)
+    return {
+        'frames': frame_total,
+        'inferences': len(detector_frames),
+        'elapsed_s': elapsed,
+        'throughput_fps': frame_total / elapsed if elapsed > 0 else 0.0,
+        'reveals': len(truth['events']),
+        'missed_reveals': missed_reveals,
+        'false_changes': len(unmatched),
+        'latency_wall_p50_s': percentile(wall_latencies, 50),
+        'latency_wall_p95_s': percentile(wall_latencies, 95),
+        'latency_video_p50_s': percentile(video_latencies, 50),
+        'latency_video_p95_s': percentile(video_latencies, 95),
+        'cell_accuracy': correct_cells / (frame_total * 25) if frame_total else 0.0,
+        'final_cell_accuracy': float((final_types == truth_types).mean())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark throughput, latency and accuracy of the board tracker")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    game_options = argparse.ArgumentParser(add_help=False)
+    game_options.add_argument("--duration", type=float, default=60.0, help="Synthetic video length in seconds")
+    game_options.add_argument("--reveals", type=int, default=10, help="Cards revealed during the video")
+    game_options.add_argument("--jitter", type=float, default=3.0, help="Camera jitter in pixels")
+    game_options.add_argument("--seed", type=int, default=0)
+
+    generate_parser = subparsers.add_parser("generate", parents=[game_options], help="Write a synthetic game video")
+    generate_parser.add_argument("video", help="Output .mp4 path, the ground truth goes next to it as .json")
+
+    run_parser = subparsers.add_parser("run", parents=[game_options], help="Run the benchmark")
+    run_parser.add_argument("--video", help="Recorded or generated video, synthetic in memory if omitted")
+    run_parser.add_argument("--truth", help="Ground-truth event log, defaults to the video path with .json")
+    run_parser.add_argument("--output", default="benchmark_results.jsonl", help="JSON lines file to append results to")
+    run_parser.add_argument("--label", default="", help="Free-form label stored with the results")
+    run_parser.add_argument("--model", default="models/grid_model.pt")
+    run_parser.add_argument("--backend", choices=BACKENDS, default="pytorch")
+    run_parser.add_argument("--int8", action="store_true")
+    run_parser.add_argument("--threshold", type=int, default=3)
+    run_parser.add_argument("--skip", type=int, default=5)
+    run_parser.add_argument("--batch-size", type=int, default=1)
+    run_parser.add_argument("--motion-gate", action="store_true")
+    run_parser.add_argument("--register", action="store_true")
+    run_parser.add_argument("--roi", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        game = SyntheticGame(duration=args.duration, reveals=args.reveals, jitter=args.jitter, seed=args.seed)
+        truth_path = write_synthetic_video(game, args.video)
+        print(f"Wrote {args.video} and {truth_path}")
+        return
+
+    cap = None
+    if args.video:
+        truth_path = args.truth or os.path.splitext(args.video)[0] + ".json"
+        with open(truth_path) as truth_file:
+            truth = json.load(truth_file)
+        cap = cv2.VideoCapture(args.video)
+        frames = read_video_frames(cap)
+    else:
+        game = SyntheticGame(duration=args.duration, reveals=args.reveals, jitter=args.jitter, seed=args.seed)
+        truth = game.ground_truth()
+        frames = game.frames()
+
+    tracker = BoardTracker(
+        GridDetector(args.model, args.backend, args.int8),
+        change_threshold=args.threshold,
+        frames_to_skip=args.skip,
+        batch_size=args.batch_size,
+        motion_gate=MotionGate() if args.motion_gate else None,
+        registration=BoardRegistration() if args.register else None,
+        roi=BoardROI() if args.roi else None
+    )
+    results = run_benchmark(tracker, frames, truth)
+    if cap is not None:
+        cap.release()
+
+    record = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'label': args.label,
+        'host': platform.node(),
+        'cpu_count': os.cpu_count(),
+        'source': args.video or f"synthetic:seed={args.seed}",
+        'config': {
+            'backend': args.backend,
+            'int8': args.int8,
+            'threshold': args.threshold,
+            'skip': args.skip,
+            'batch_size': args.batch_size,
+            'motion_gate': args.motion_gate,
+            'register': args.register,
+            'roi': args.roi
+        },
+        'results': results
+    }
+    with open(args.output, 'a') as output_file:
+        output_file.write(json.dumps(record) + "\n")
+
+    for name, value in results.items():
+        print(f"{name}: {value}")
+
+if __name__ == "__main__":
+    main()
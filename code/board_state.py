@@ -0,0 +1,89 @@
+import numpy as np
+
+# Codename, red agent, blue agent, neutral bystander, assassin
+CARD_CLASSES = 5
+
+class BoardState:
+    """
+    Array-backed board: a 5x5 array of confirmed card types and a 5x5xC array
+    of votes for a pending change of each cell.
+
+    A cell changes once the votes for a new type reach CHANGE_THRESHOLD. A
+    detection of the cell's current type clears its votes, and a detection of
+    another type drops the votes for the types not seen. With decay 1.0 and
+    unweighted votes this is the consecutive-detection count the app always
+    used; confidence weighting makes each detection vote its confidence, and
+    decay < 1.0 lets the votes of a type fade while it is not detected.
+    """
+    # Votes that have faded below this are dropped, so the cell is settled again
+    MIN_VOTE = 1e-3
+
+    def __init__(self, change_threshold=3, decay=1.0, confidence_weighted=False, classes=CARD_CLASSES):
+        if not 0 < decay <= 1:
+            raise ValueError(f"decay must be in (0, 1], got {decay}")
+        self.CHANGE_THRESHOLD = change_threshold
+        self.decay = decay
+        self.confidence_weighted = confidence_weighted
+        self.classes = classes
+
+        self.types = np.zeros((5, 5), dtype=np.int8)
+        self.votes = np.zeros((5, 5, classes), dtype=np.float32)
+        # Scratch array reused for every batch of detections
+        self.batch_votes = np.zeros_like(self.votes)
+
+    def has_pending_changes(self):
+        return bool(self.votes.any())
+
+    def set_type(self, x, y, card_type):
+        self.types[y, x] = card_type
+        self.votes[y, x] = 0
+
+    def apply(self, grid_x, grid_y, classes, confidences=None):
+        """
+        Votes one batch of detections given as parallel arrays. Returns the
+        confirmed changes as arrays (xs, ys, old_types, new_types).
+        """
+        grid_x = np.asarray(grid_x, dtype=np.intp)
+        grid_y = np.asarray(grid_y, dtype=np.intp)
+        classes = np.asarray(classes, dtype=np.intp)
+        if self.confidence_weighted and confidences is not None:
+            weights = np.asarray(confidences, dtype=np.float32)
+        else:
+            weights = np.ones(len(classes), dtype=np.float32)
+
+        known = (classes >= 0) & (classes < self.classes)
+        self.batch_votes.fill(0)
+        np.add.at(self.batch_votes, (grid_y[known], grid_x[known], classes[known]), weights[known])
+
+        seen = self.batch_votes > 0
+        detected_cells = seen.any(axis=2)
+        current_type_seen = np.take_along_axis(seen, self.types[..., np.newaxis].astype(np.intp), axis=2)[..., 0]
+
+        # Decay the types not seen in this batch, and in detected cells drop
+        # them; votes that keep coming in add up at full weight
+        self.votes[~seen] *= self.decay
+        self.votes[detected_cells] *= seen[detected_cells]
+        self.votes += self.batch_votes
+        self.votes[current_type_seen] = 0
+        self.votes[self.votes < self.MIN_VOTE] = 0
+
+        best_types = self.votes.argmax(axis=2)
+        best_votes = self.votes.max(axis=2)
+        confirmed = best_votes >= self.CHANGE_THRESHOLD
+
+        ys, xs = np.nonzero(confirmed)
+        old_types = self.types[ys, xs].copy()
+        new_types = best_types[ys, xs]
+        self.types[ys, xs] = new_types
+        self.votes[ys, xs] = 0
+        return xs, ys, old_types, new_types
+
+    def apply_detections(self, detections):
+        # Convenience wrapper for lists of detection dicts
+        count = len(detections)
+        return self.apply(
+            np.fromiter((d['grid_x'] for d in detections), dtype=np.intp, count=count),
+            np.fromiter((d['grid_y'] for d in detections), dtype=np.intp, count=count),
+            np.fromiter((d['class'] for d in detections), dtype=np.intp, count=count),
+            np.fromiter((d.get('confidence', 1.0) for d in detections), dtype=np.float32, count=count)
+        )
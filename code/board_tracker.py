@@ -0,0 +1,496 @@
+import argparse
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+import cv2
+import numpy as np
+from backends import BACKENDS
+from frame_source import PrefetchReader, open_source, is_live_source, parse_source
+from ocr_handler import OCRHandler
+from yolo import GridDetector
+from inference_worker import RemoteGridDetector
+from motion import MotionGate
+from registration import BoardRegistration
+from board_state import BoardState
+from detection_log import DetectionRecorder
+from roi import BoardROI
+from cell_classifier import CellClassifier
+from card_tracker import CardTracker
+from scheduler import FrameScheduler
+from metrics import metrics, add_profiling_arguments, configure_profiling
+
+class BoardTracker:
+    """
+    Headless board-state engine. Consumes frames from any iterator, runs the
+    grid detector on sampled frames and emits confirmed card changes.
+    """
+    def __init__(self, detector, ocr=None, change_threshold=3, frames_to_skip=5,
+                 batch_size=1, max_wait=0.05, motion_gate=None, registration=None,
+                 decay=1.0, confidence_weighted=False, recorder=None, roi=None,
+                 classifier=None, full_pass_interval=10, card_tracker=None, scheduler=None):
+        self.detector = detector
+        self.ocr = ocr
+        self.CHANGE_THRESHOLD = change_threshold
+        self.FRAMES_TO_SKIP = frames_to_skip
+
+        # Sampled frames per model call in run(), and how long the first
+        # sampled frame of a batch may wait for the rest
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+
+        # Optional MotionGate, skips inference while the board is static
+        self.motion_gate = motion_gate
+        self.last_inference_frame = 0
+        # Frames picked by a sampling_rule reader, already spaced out
+        self.sampled_frames = deque()
+
+        # Optional BoardRegistration, maps cards through a homography and
+        # runs detection on the warped canonical board
+        self.registration = registration
+
+        # Optional BoardROI, runs detection on a crop around the board at a
+        # smaller input size; ignored when registration is set
+        self.roi = roi
+
+        # Optional CellClassifier, classifies the crops at the last boxes
+        # instead of running the detector; a full pass still runs every
+        # full_pass_interval sampled frames or when it is uncertain.
+        # Ignored when registration is set, its boxes are not in frame space
+        self.classifier = classifier
+        self.full_pass_interval = full_pass_interval
+        self.frames_since_full_pass = 0
+
+        # Optional DetectionRecorder, logs every sampled frame's detections
+        # for offline replay, with the size of the image the boxes refer to
+        self.recorder = recorder
+        self.detection_image_size = None
+
+        # Optional CardTracker, keeps each card's cell and word across frames
+        # and reads the word of cards first seen after initialize. Ignored
+        # when registration is set, warped and full-frame passes give boxes
+        # in different spaces and the homography already fixes the cells
+        self.card_tracker = card_tracker if registration is None else None
+
+        # Optional FrameScheduler, sets FRAMES_TO_SKIP and the model input
+        # size from the measured detector latency
+        self.scheduler = scheduler
+
+        # Confirmed types and pending-change votes, see BoardState
+        self.board = BoardState(change_threshold, decay, confidence_weighted)
+        self.cell_texts = [["" for _ in range(5)] for _ in range(5)]
+        self.frame_count = 0
+        # When each cell's pending change got its first vote, for profiling
+        self.pending_since = np.zeros((5, 5))
+
+    @property
+    def cell_types(self):
+        return self.board.types
+
+    def get_cell_type(self, x, y):
+        return int(self.board.types[y, x])
+
+    def get_cell_text(self, x, y):
+        return self.cell_texts[y][x]
+
+    def initialize(self, frame, detections=None):
+        """
+        Reads the codename of every detected card in the first frame.
+        Returns a list of {'x', 'y', 'text'} entries for the cells found.
+        """
+        initialized_cells = []
+
+        if detections is None:
+            detections = self.detector.process_image(frame)
+        if self.registration is not None and self.registration.update(detections):
+            detections = self.registration.map_detections(detections)
+
+        # Read all cards in one parallel, cached OCR pass
+        if self.ocr is not None:
+            texts = self.ocr.get_card_texts(frame, [detection['bbox'] for detection in detections])
+        else:
+            texts = ["" for _ in detections]
+
+        if self.card_tracker is not None:
+            tracked_detections, _ = self.card_tracker.update(detections)
+            for tracked_detection, text in zip(tracked_detections, texts):
+                self.card_tracker.get_track(tracked_detection['track_id']).text = text
+
+        for detection, text in zip(detections, texts):
+            if text:
+                x, y = detection['grid_x'], detection['grid_y']
+                self.cell_texts[y][x] = text
+                self.board.set_type(x, y, 0)
+                initialized_cells.append({'x': x, 'y': y, 'text': text})
+
+        return initialized_cells
+
+    def process_frame(self, frame, frame_index=None):
+        """
+        Feeds one decoded frame to the tracker. Returns the list of changes
+        confirmed by this frame (empty when the frame was skipped).
+        """
+        if self.sample_frame(frame, frame_index) is None:
+            return []
+
+        return self.apply_detections(self._detect_batch([frame])[0], frame=frame)
+
+    def sample_frame(self, frame, frame_index=None):
+        """
+        Counts one decoded frame and decides whether it goes to the detector.
+        Returns the frame index when it does, None otherwise. Lets callers run
+        the detection themselves and hand the results to apply_detections.
+        frame_index is given by readers that skip frames without decoding them.
+        """
+        if frame_index is None:
+            self.frame_count += 1
+        else:
+            self.frame_count = frame_index
+        if not self._should_infer(frame):
+            return None
+        return self.frame_count
+
+    def _detect_batch(self, frames):
+        if self.classifier is None or self.registration is not None:
+            return self._detect_full(frames)
+
+        results = [None] * len(frames)
+        if self.frames_since_full_pass < self.full_pass_interval and self.classifier.is_ready():
+            results = [self.classifier.classify(frame) for frame in frames]
+
+        full_pass = [index for index, detections in enumerate(results) if detections is None]
+        metrics.increment("classified_frames", len(frames) - len(full_pass))
+        if not full_pass:
+            self.frames_since_full_pass += len(frames)
+            return results
+
+        for index, detections in zip(full_pass, self._detect_full([frames[index] for index in full_pass])):
+            results[index] = detections
+            self.classifier.learn(frames[index], detections)
+        self.frames_since_full_pass = 0
+        return results
+
+    def _detect_full(self, frames):
+        imgsz = self.scheduler.imgsz if self.scheduler is not None else None
+        start_time = time.perf_counter()
+        with metrics.timer("detect"):
+            if self.registration is not None:
+                results = self.registration.detect_batch(self.detector, frames)
+            elif self.roi is not None:
+                results = self.roi.detect_batch(self.detector, frames, imgsz=imgsz)
+            else:
+                results = self.detector.process_batch(frames, imgsz=imgsz)
+
+        if self.scheduler is not None:
+            self.scheduler.observe_inference(time.perf_counter() - start_time)
+            self.FRAMES_TO_SKIP = self.scheduler.frames_to_skip
+
+        if self.registration is not None and self.registration.last_batch_warped:
+            self.detection_image_size = self.registration.canonical_size
+        else:
+            height, width = frames[0].shape[:2]
+            self.detection_image_size = (width, height)
+        return results
+
+    def sampling_rule(self):
+        """
+        Returns a wanted callable for PrefetchReader that picks frames with
+        the spacing _should_infer enforces, following FRAMES_TO_SKIP as the
+        scheduler changes it. A modulo stride would drift out of phase with
+        the last inference and decode frames that then get skipped. The
+        frames it picks are not checked for spacing again, so a longer skip
+        set while they were buffered does not discard them either.
+        """
+        last_sampled = self.last_inference_frame
+
+        def wanted(frame_index):
+            nonlocal last_sampled
+            if frame_index - last_sampled < self.FRAMES_TO_SKIP + 1:
+                return False
+            last_sampled = frame_index
+            self.sampled_frames.append(frame_index)
+            return True
+        return wanted
+
+    def _should_infer(self, frame):
+        # Never run YOLO more often than every (FRAMES_TO_SKIP + 1)th frame,
+        # unless the reader already picked this frame by that rule
+        while self.sampled_frames and self.sampled_frames[0] < self.frame_count:
+            self.sampled_frames.popleft()
+        sampled = bool(self.sampled_frames) and self.sampled_frames[0] == self.frame_count
+        if sampled:
+            self.sampled_frames.popleft()
+        elif self.frame_count - self.last_inference_frame < self.FRAMES_TO_SKIP + 1:
+            return False
+
+        # Keep inferring while a change is waiting for confirmation
+        if self.motion_gate is not None:
+            with metrics.timer("motion_gate"):
+                triggered = self.motion_gate.should_infer(
+                    frame, self.frame_count, force=self.board.has_pending_changes())
+            if not triggered:
+                metrics.increment("frames_gated")
+                return False
+
+        self.last_inference_frame = self.frame_count
+        return True
+
+    def apply_detections(self, detections, frame_index=None, frame=None):
+        """
+        Votes the detections of one sampled frame into the board state and
+        returns the changes that reached CHANGE_THRESHOLD. frame is only
+        needed to read the words of newly tracked cards.
+        """
+        if frame_index is None:
+            frame_index = self.frame_count
+        if self.recorder is not None:
+            self.recorder.record(frame_index, detections, self.detection_image_size)
+        if self.card_tracker is not None:
+            detections = self._track_cards(detections, frame)
+
+        with metrics.timer("board_update"):
+            xs, ys, old_types, new_types = self.board.apply_detections(detections)
+        if metrics.enabled:
+            self._record_reveal_latency(xs, ys)
+
+        return [
+            {
+                'x': x,
+                'y': y,
+                'old_type': old_type,
+                'new_type': new_type,
+                'frame': frame_index
+            }
+            for x, y, old_type, new_type in zip(xs.tolist(), ys.tolist(), old_types.tolist(), new_types.tolist())
+        ]
+
+    def _track_cards(self, detections, frame):
+        with metrics.timer("card_tracking"):
+            detections, new_tracks = self.card_tracker.update(detections)
+        metrics.increment("new_card_tracks", len(new_tracks))
+
+        # Only hidden cards show a word
+        new_tracks = [track for track in new_tracks if track.card_type == 0]
+        if new_tracks and frame is not None and self.ocr is not None:
+            texts = self.ocr.get_card_texts(frame, [track.bbox.tolist() for track in new_tracks])
+            for track, text in zip(new_tracks, texts):
+                track.text = text
+                if text and not self.cell_texts[track.grid_y][track.grid_x]:
+                    self.cell_texts[track.grid_y][track.grid_x] = text
+        return detections
+
+    def _record_reveal_latency(self, xs, ys):
+        # Time from the first vote for a change to its confirmation
+        now = time.perf_counter()
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            if self.pending_since[y, x]:
+                metrics.observe("reveal_to_confirmation", now - self.pending_since[y, x])
+
+        pending = self.board.votes.any(axis=2)
+        self.pending_since[~pending] = 0
+        self.pending_since[pending & (self.pending_since == 0)] = now
+
+    def run(self, frames):
+        """
+        Processes every frame from the iterator as fast as the models allow,
+        yielding each confirmed change as it happens.
+        When batch_size > 1, sampled frames are grouped into one model call.
+        """
+        return self.run_indexed(enumerate(frames, start=self.frame_count + 1))
+
+    def run_indexed(self, indexed_frames):
+        """
+        Same as run, for (frame_index, frame) pairs such as those yielded by
+        PrefetchReader, where skipped frames were never decoded.
+        """
+        if self.batch_size == 1:
+            for frame_index, frame in indexed_frames:
+                for change in self.process_frame(frame, frame_index):
+                    yield change
+            return
+
+        # Frames are read on a feeder thread so a partial batch is flushed
+        # when its first frame has waited max_wait, not when the next
+        # sampled frame happens to arrive
+        frames = queue.Queue(maxsize=1)
+        stopped = threading.Event()
+        feeder = threading.Thread(target=self._feed_frames, args=(indexed_frames, frames, stopped))
+        feeder.daemon = True
+        feeder.start()
+
+        batch = []
+        deadline = 0.0
+        try:
+            while True:
+                try:
+                    item = frames.get(timeout=max(0.0, deadline - time.perf_counter()) if batch else None)
+                except queue.Empty:
+                    for change in self._apply_batch(batch):
+                        yield change
+                    batch = []
+                    continue
+                if item is None:
+                    break
+
+                frame_index, frame = item
+                frame_index = self.sample_frame(frame, frame_index)
+                if frame_index is None:
+                    continue
+
+                if not batch:
+                    deadline = time.perf_counter() + self.max_wait
+                batch.append((frame_index, frame))
+
+                if len(batch) >= self.batch_size or time.perf_counter() >= deadline:
+                    for change in self._apply_batch(batch):
+                        yield change
+                    batch = []
+
+            for change in self._apply_batch(batch):
+                yield change
+        finally:
+            stopped.set()
+
+    @staticmethod
+    def _feed_frames(indexed_frames, frames, stopped):
+        for item in itertools.chain(indexed_frames, [None]):
+            # Give up once the consumer has stopped iterating
+            while not stopped.is_set():
+                try:
+                    frames.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            if stopped.is_set():
+                return
+
+    def _apply_batch(self, batch):
+        if not batch:
+            return []
+
+        results = self._detect_batch([frame for _, frame in batch])
+        confirmed_changes = []
+        for (frame_index, frame), detections in zip(batch, results):
+            confirmed_changes.extend(self.apply_detections(detections, frame_index, frame))
+        return confirmed_changes
+
+def read_video_frames(cap):
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the board tracker headless over a video or live source")
+    parser.add_argument("video", help="Video file, camera index or stream URL")
+    parser.add_argument("--realtime", action="store_true", help="Play files at their frame rate instead of max speed")
+    parser.add_argument("--width", type=int, help="Capture width for live sources")
+    parser.add_argument("--height", type=int, help="Capture height for live sources")
+    parser.add_argument("--capture-fps", type=int, help="Capture frame rate for live sources")
+    parser.add_argument("--model", default="models/grid_model.pt", help="Grid detection model")
+    parser.add_argument("--backend", choices=BACKENDS, default="pytorch", help="Inference backend")
+    parser.add_argument("--int8", action="store_true", help="Use INT8 quantized weights (onnx/openvino)")
+    parser.add_argument("--threshold", type=int, default=3, help="Detections needed to confirm a change")
+    parser.add_argument("--skip", type=int, default=5, help="Frames skipped between detections")
+    parser.add_argument("--decay", type=float, default=1.0, help="Per-detection decay of pending change votes")
+    parser.add_argument("--confidence-weighted", action="store_true", help="Weight change votes by confidence")
+    parser.add_argument("--batch-size", type=int, default=1, help="Sampled frames per model call")
+    parser.add_argument("--max-wait", type=float, default=0.05, help="Max seconds a sampled frame waits for its batch")
+    parser.add_argument("--motion-gate", action="store_true", help="Only run detection when the board changes")
+    region_options = parser.add_mutually_exclusive_group()
+    region_options.add_argument("--register", action="store_true", help="Register the board with a homography")
+    region_options.add_argument("--roi", action="store_true", help="Detect on a crop around the board")
+    parser.add_argument("--cell-classifier", action="store_true",
+                        help="Classify card crops between full detector passes")
+    parser.add_argument("--full-pass-interval", type=int, default=10,
+                        help="Max sampled frames between full detector passes with --cell-classifier")
+    parser.add_argument("--track-cards", action="store_true",
+                        help="Keep each card's cell and word across frames with a box tracker")
+    parser.add_argument("--latency-target", type=float,
+                        help="Adapt --skip at runtime to confirm reveals within this many seconds")
+    parser.add_argument("--adaptive-resolution", action="store_true",
+                        help="With --latency-target, also lower the model input size when needed")
+    parser.add_argument("--inference-process", action="store_true",
+                        help="Run detection in a separate worker process")
+    parser.add_argument("--no-ocr", action="store_true", help="Skip reading the card texts")
+    parser.add_argument("--ocr-cache", help="File to persist OCR results across runs")
+    parser.add_argument("--fast-ocr", action="store_true",
+                        help="Read only the word band of each card with the recognizer, skipping text detection")
+    parser.add_argument("--record", help="Log every sampled frame's detections to this file for replay")
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+    if args.track_cards and args.register:
+        parser.error("--track-cards cannot be combined with --register")
+    if not 0 < args.decay <= 1:
+        parser.error("--decay must be greater than 0 and at most 1")
+    configure_profiling(args)
+
+    cap = open_source(args.video, args.width, args.height, args.capture_fps, args.realtime)
+    ret, frame = cap.read()
+    if not ret:
+        print("Error: Could not read initial frame")
+        return
+
+    scheduler = None
+    if args.latency_target:
+        scheduler = FrameScheduler(
+            args.latency_target,
+            source_fps=cap.get(cv2.CAP_PROP_FPS) or 30.0,
+            change_threshold=args.threshold,
+            imgsz_steps=(640, 512, 416, 320) if args.adaptive_resolution else None
+        )
+
+    detector_class = RemoteGridDetector if args.inference_process else GridDetector
+    tracker = BoardTracker(
+        detector_class(args.model, args.backend, args.int8),
+        None if args.no_ocr else OCRHandler(cache_path=args.ocr_cache, fast=args.fast_ocr),
+        change_threshold=args.threshold,
+        frames_to_skip=args.skip,
+        batch_size=args.batch_size,
+        max_wait=args.max_wait,
+        motion_gate=MotionGate() if args.motion_gate else None,
+        registration=BoardRegistration() if args.register else None,
+        decay=args.decay,
+        confidence_weighted=args.confidence_weighted,
+        recorder=DetectionRecorder(args.record) if args.record else None,
+        roi=BoardROI() if args.roi else None,
+        classifier=CellClassifier() if args.cell_classifier else None,
+        full_pass_interval=args.full_pass_interval,
+        card_tracker=CardTracker() if args.track_cards else None,
+        scheduler=scheduler
+    )
+    for cell in tracker.initialize(frame):
+        print(f"Card ({cell['x']}, {cell['y']}): {cell['text']}")
+
+    # Only the sampled frames get decoded. Live and paced sources hand over
+    # the newest decoded frame when detection falls behind
+    freshest = args.realtime or is_live_source(parse_source(args.video))
+    if scheduler is None:
+        reader = PrefetchReader(cap, wanted=args.skip + 1, start_index=1, freshest=freshest)
+    else:
+        reader = PrefetchReader(cap, wanted=tracker.sampling_rule(), start_index=1, freshest=freshest)
+        scheduler.watch(reader)
+    start_time = time.perf_counter()
+    for change in tracker.run_indexed(reader):
+        print(f"Frame {change['frame']}: cell ({change['x']}, {change['y']}) "
+              f"{change['old_type']} -> {change['new_type']}")
+    elapsed = time.perf_counter() - start_time
+    reader.close()
+    if tracker.recorder is not None:
+        tracker.recorder.close()
+    if args.inference_process:
+        tracker.detector.close()
+
+    fps = tracker.frame_count / elapsed if elapsed > 0 else 0.0
+    print(f"Processed {tracker.frame_count} frames in {elapsed:.2f}s ({fps:.1f} fps)")
+    if scheduler is not None:
+        print(f"Scheduler: {scheduler.decisions()}")
+    if metrics.enabled:
+        metrics.write_jsonl()
+        for stage, stats in sorted(metrics.snapshot()['stages'].items()):
+            print(f"{stage}: {stats['count']} calls, {stats['sum']:.3f}s total, p95 <= {stats['p95']}s")
+
+if __name__ == "__main__":
+    main()
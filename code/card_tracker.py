@@ -0,0 +1,128 @@
+import numpy as np
+from board_state import CARD_CLASSES
+
+def box_iou(boxes, other_boxes):
+    """
+    Pairwise IoU of two (n, 4) and (m, 4) arrays of x1, y1, x2, y2 boxes.
+    """
+    top_left = np.maximum(boxes[:, None, :2], other_boxes[None, :, :2])
+    bottom_right = np.minimum(boxes[:, None, 2:], other_boxes[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    areas = (boxes[:, 2:] - boxes[:, :2]).prod(axis=1)
+    other_areas = (other_boxes[:, 2:] - other_boxes[:, :2]).prod(axis=1)
+    return intersection / np.maximum(areas[:, None] + other_areas[None, :] - intersection, 1e-6)
+
+class CardTrack:
+    def __init__(self, track_id, detection):
+        self.track_id = track_id
+        self.bbox = np.array(detection['bbox'], dtype=np.float32)
+        # Cell and word are fixed when the card is first seen
+        self.grid_x = detection['grid_x']
+        self.grid_y = detection['grid_y']
+        self.text = ""
+        self.class_votes = np.zeros(CARD_CLASSES, dtype=np.float32)
+        self.card_type = detection['class']
+        self.misses = 0
+
+class CardTracker:
+    """
+    Gives every card a stable identity across frames by matching boxes on
+    IoU, then on centroid distance for larger jumps. A card keeps the cell
+    and word it had when its track was created, so a bumped board or a moved
+    camera does not shuffle cells, and per-card work such as OCR only runs
+    for new tracks.
+    """
+    def __init__(self, min_iou=0.3, max_distance=0.75, max_misses=10, class_decay=0.5):
+        self.min_iou = min_iou
+        # Centroid fallback radius, as a fraction of the track's box diagonal
+        self.max_distance = max_distance
+        # Sampled frames a track survives without a matching detection
+        self.max_misses = max_misses
+        # Per-track class smoothing: old votes are scaled by class_decay on
+        # every detection, 0 follows the detector directly
+        self.class_decay = class_decay
+        self.tracks = []
+        self.next_track_id = 1
+
+    def get_track(self, track_id):
+        for track in self.tracks:
+            if track.track_id == track_id:
+                return track
+        return None
+
+    def _match(self, boxes):
+        # Greedy one-to-one matching, best IoU first
+        matches = {}
+        if not self.tracks or not len(boxes):
+            return matches
+
+        track_boxes = np.array([track.bbox for track in self.tracks])
+        ious = box_iou(track_boxes, boxes)
+        for track_index, detection_index in zip(*np.unravel_index(np.argsort(-ious, axis=None), ious.shape)):
+            if ious[track_index, detection_index] < self.min_iou:
+                break
+            if track_index not in matches and detection_index not in matches.values():
+                matches[track_index] = detection_index
+
+        # Cards that jumped too far to overlap, nearest centroid first
+        track_centers = (track_boxes[:, :2] + track_boxes[:, 2:]) / 2
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        distances = np.linalg.norm(track_centers[:, None] - centers[None], axis=2)
+        diagonals = np.linalg.norm(track_boxes[:, 2:] - track_boxes[:, :2], axis=1)
+        distances[distances > self.max_distance * diagonals[:, None]] = np.inf
+        distances[list(matches), :] = np.inf
+        distances[:, list(matches.values())] = np.inf
+        for track_index, detection_index in zip(*np.unravel_index(np.argsort(distances, axis=None), distances.shape)):
+            if not np.isfinite(distances[track_index, detection_index]):
+                break
+            if track_index not in matches and detection_index not in matches.values():
+                matches[track_index] = detection_index
+        return matches
+
+    def update(self, detections):
+        """
+        Matches one frame's detections to the tracks. Returns the detections,
+        in order, rewritten with each track's cell and smoothed class, and
+        the tracks created by this frame.
+        """
+        boxes = np.array([detection['bbox'] for detection in detections], dtype=np.float32).reshape(-1, 4)
+        matches = self._match(boxes)
+
+        # Same order as detections
+        tracked_detections = [None] * len(detections)
+        for track_index, track in enumerate(self.tracks):
+            if track_index not in matches:
+                track.misses += 1
+                continue
+            detection_index = matches[track_index]
+            track.bbox = boxes[detection_index]
+            track.misses = 0
+            tracked_detections[detection_index] = self._smooth(track, detections[detection_index])
+
+        new_tracks = []
+        for detection_index, detection in enumerate(detections):
+            if tracked_detections[detection_index] is None:
+                track = CardTrack(self.next_track_id, detection)
+                self.next_track_id += 1
+                new_tracks.append(track)
+                tracked_detections[detection_index] = self._smooth(track, detection)
+
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses] + new_tracks
+        return tracked_detections, new_tracks
+
+    def _smooth(self, track, detection):
+        track.class_votes *= self.class_decay
+        track.class_votes[detection['class']] += detection.get('confidence', 1.0)
+        # Only switch class once the new one strictly outweighs the old
+        best_class = int(np.argmax(track.class_votes))
+        if track.class_votes[best_class] > track.class_votes[track.card_type]:
+            track.card_type = best_class
+
+        return dict(
+            detection,
+            grid_x=track.grid_x,
+            grid_y=track.grid_y,
+            confidence=float(track.class_votes[track.card_type] / track.class_votes.sum()),
+            track_id=track.track_id,
+            **{'class': track.card_type}
+        )
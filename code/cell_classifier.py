@@ -0,0 +1,111 @@
+import cv2
+import numpy as np
+from board_state import CARD_CLASSES
+from metrics import metrics
+
+class CellClassifier:
+    """
+    Cheap stand-in for the grid detector between full YOLO passes. Reuses the
+    card boxes of the last full pass and classifies each crop by the nearest
+    colour-histogram prototype, learned online from the YOLO labels. Frames
+    it is unsure about are handed back for a full pass.
+    """
+    def __init__(self, hue_bins=8, saturation_bins=3, value_bins=3, crop_size=(24, 16),
+                 learning_rate=0.1, min_samples=3, max_margin=0.6, outlier_ratio=3.0):
+        self.bins = (hue_bins, saturation_bins, value_bins)
+        self.feature_size = hue_bins * saturation_bins * value_bins
+        self.crop_size = crop_size
+        # Weight of a new sample in its class prototype once warmed up
+        self.learning_rate = learning_rate
+        # Samples a class needs before it can be predicted
+        self.min_samples = min_samples
+        # Uncertain when best / second best distance exceeds max_margin, or
+        # when the best distance is outlier_ratio times the class spread
+        self.max_margin = max_margin
+        self.outlier_ratio = outlier_ratio
+
+        self.prototypes = np.zeros((CARD_CLASSES, self.feature_size), dtype=np.float32)
+        self.spreads = np.zeros(CARD_CLASSES, dtype=np.float32)
+        self.sample_counts = np.zeros(CARD_CLASSES, dtype=np.int64)
+        self.detections = []
+
+    def features(self, frame, bboxes):
+        """
+        Normalized HSV histograms of every box, as an (n, feature_size)
+        array. All crops are converted and binned in one batch.
+        """
+        crop_width, crop_height = self.crop_size
+        frame_height, frame_width = frame.shape[:2]
+        crops = np.empty((len(bboxes) * crop_height, crop_width, 3), dtype=np.uint8)
+        for index, (x1, y1, x2, y2) in enumerate(bboxes):
+            x1, y1 = max(0, int(x1)), max(0, int(y1))
+            x2, y2 = min(frame_width, max(x1 + 1, int(x2))), min(frame_height, max(y1 + 1, int(y2)))
+            crops[index * crop_height:(index + 1) * crop_height] = cv2.resize(
+                frame[y1:y2, x1:x2], self.crop_size, interpolation=cv2.INTER_AREA)
+
+        hsv = cv2.cvtColor(crops, cv2.COLOR_BGR2HSV).reshape(len(bboxes), -1, 3).astype(np.intp)
+        hue_bins, saturation_bins, value_bins = self.bins
+        bin_index = ((hsv[..., 0] * hue_bins // 180) * saturation_bins
+                     + hsv[..., 1] * saturation_bins // 256) * value_bins + hsv[..., 2] * value_bins // 256
+
+        # Offset each crop's bins so one bincount builds every histogram
+        bin_index += np.arange(len(bboxes))[:, None] * self.feature_size
+        histograms = np.bincount(bin_index.ravel(), minlength=len(bboxes) * self.feature_size)
+        return histograms.reshape(len(bboxes), self.feature_size).astype(np.float32) / (crop_width * crop_height)
+
+    def learn(self, frame, detections):
+        """
+        Updates the prototypes from a full detector pass and keeps its boxes
+        for the following cheap passes.
+        """
+        self.detections = detections
+        if not detections:
+            return
+
+        features = self.features(frame, [detection['bbox'] for detection in detections])
+        classes = np.array([detection['class'] for detection in detections])
+        for card_class in np.unique(classes).tolist():
+            if not 0 <= card_class < CARD_CLASSES:
+                continue
+            class_features = features[classes == card_class]
+            distances = np.abs(class_features - self.prototypes[card_class]).sum(axis=1)
+
+            # Plain running mean while warming up, then an exponential one
+            count = self.sample_counts[card_class]
+            weight = max(self.learning_rate, len(class_features) / (count + len(class_features)))
+            self.prototypes[card_class] += weight * (class_features.mean(axis=0) - self.prototypes[card_class])
+            if count:
+                self.spreads[card_class] += weight * (float(distances.mean()) - self.spreads[card_class])
+            self.sample_counts[card_class] = count + len(class_features)
+
+    def is_ready(self):
+        # Needs boxes to reuse and at least the hidden and one revealed class
+        known = self.sample_counts >= self.min_samples
+        return bool(self.detections) and known[0] and known[1:].any()
+
+    def classify(self, frame):
+        """
+        Classifies the crops at the last full pass's boxes. Returns the
+        detections, or None when any card is too uncertain to trust.
+        """
+        with metrics.timer("cell_classifier"):
+            features = self.features(frame, [detection['bbox'] for detection in self.detections])
+
+            # L1 distance of every crop to every usable prototype
+            distances = np.abs(features[:, None, :] - self.prototypes[None, :, :]).sum(axis=2)
+            distances[:, self.sample_counts < self.min_samples] = np.inf
+            order = np.argsort(distances, axis=1)
+            rows = np.arange(len(features))
+            best_class = order[:, 0]
+            best = distances[rows, best_class]
+            second = distances[rows, order[:, 1]]
+
+            margins = best / np.maximum(second, 1e-6)
+            outliers = best > self.outlier_ratio * np.maximum(self.spreads[best_class], 1e-3)
+            if (margins > self.max_margin).any() or outliers.any():
+                return None
+
+        return [
+            dict(detection, **{'class': card_class, 'confidence': 1.0 - margin})
+            for detection, card_class, margin in zip(self.detections, best_class.tolist(), margins.tolist())
+        ]
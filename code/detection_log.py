@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+from board_state import BoardState
+
+# One row per detection. Sampled frames without detections get a single row
+# with class -1, so replay sees every inference the tracker made.
+DETECTION_DTYPE = np.dtype([
+    ('frame', '<u4'),
+    ('timestamp', '<f8'),
+    ('x1', '<f4'),
+    ('y1', '<f4'),
+    ('x2', '<f4'),
+    ('y2', '<f4'),
+    ('confidence', '<f4'),
+    ('class', '<i1'),
+    ('grid_x', '<i1'),
+    ('grid_y', '<i1'),
+    ('image_width', '<u2'),
+    ('image_height', '<u2')
+])
+
+class DetectionRecorder:
+    """
+    Writes raw detections to a flat binary file of DETECTION_DTYPE rows,
+    which DetectionLog memory-maps back without parsing. An existing log at
+    the same path is replaced, one file holds one run.
+    """
+    def __init__(self, log_path, flush_rows=4096):
+        self.log_path = log_path
+        self.log_file = open(log_path, 'wb')
+        self.rows = np.zeros(flush_rows, dtype=DETECTION_DTYPE)
+        self.row_count = 0
+
+    def record(self, frame_index, detections, image_size=None, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        image_width, image_height = image_size or (0, 0)
+
+        for detection in detections or [None]:
+            if self.row_count == len(self.rows):
+                self.flush()
+            row = self.rows[self.row_count]
+            row['frame'] = frame_index
+            row['timestamp'] = timestamp
+            row['image_width'] = image_width
+            row['image_height'] = image_height
+            if detection is None:
+                row['class'] = -1
+                row['grid_x'] = row['grid_y'] = -1
+                row['x1'] = row['y1'] = row['x2'] = row['y2'] = row['confidence'] = 0
+            else:
+                row['x1'], row['y1'], row['x2'], row['y2'] = detection['bbox']
+                row['confidence'] = detection.get('confidence', 1.0)
+                row['class'] = detection['class']
+                row['grid_x'] = detection['grid_x']
+                row['grid_y'] = detection['grid_y']
+            self.row_count += 1
+
+    def flush(self):
+        self.rows[:self.row_count].tofile(self.log_file)
+        self.log_file.flush()
+        self.row_count = 0
+
+    def close(self):
+        self.flush()
+        self.log_file.close()
+
+class DetectionLog:
+    """
+    Read-only, memory-mapped view of a detection log.
+    """
+    def __init__(self, log_path):
+        if os.path.getsize(log_path) == 0:
+            self.rows = np.zeros(0, dtype=DETECTION_DTYPE)
+        else:
+            self.rows = np.memmap(log_path, dtype=DETECTION_DTYPE, mode='r')
+
+        # Rows are appended in frame order, so each frame is one contiguous run
+        frames = self.rows['frame']
+        self.frame_starts = np.concatenate(([0], np.flatnonzero(np.diff(frames)) + 1)).astype(np.intp)
+        self.frame_ends = np.concatenate((self.frame_starts[1:], [len(frames)])).astype(np.intp)
+        if len(frames) == 0:
+            self.frame_starts = self.frame_ends = np.zeros(0, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.frame_starts)
+
+    def frame_indices(self):
+        return self.rows['frame'][self.frame_starts]
+
+    def rows_between(self, start_time, end_time):
+        # Rows whose timestamp falls in [start_time, end_time)
+        timestamps = self.rows['timestamp']
+        return self.rows[np.searchsorted(timestamps, start_time):np.searchsorted(timestamps, end_time)]
+
+    def frames(self):
+        """
+        Yields (frame_index, rows) per sampled frame, rows excluding the
+        placeholder of frames without detections.
+        """
+        for start, end in zip(self.frame_starts.tolist(), self.frame_ends.tolist()):
+            rows = self.rows[start:end]
+            yield int(rows['frame'][0]), rows[rows['class'] >= 0]
+
+def remap_to_grid(rows):
+    # The proportional mapping of boxes_to_detections, on whole arrays
+    center_x = (rows['x1'] + rows['x2']) / 2
+    center_y = (rows['y1'] + rows['y2']) / 2
+    grid_x = np.floor(center_x / np.maximum(rows['image_width'], 1) * 5).astype(np.intp)
+    grid_y = np.floor(center_y / np.maximum(rows['image_height'], 1) * 5).astype(np.intp)
+    return grid_x, grid_y
+
+def replay(log, change_threshold=3, decay=1.0, confidence_weighted=False, remap=False, initial_types=None):
+    """
+    Feeds a recorded log through the change tracking without any model and
+    returns the confirmed changes in order, plus the final board types.
+    """
+    board = BoardState(change_threshold, decay, confidence_weighted)
+    if initial_types is not None:
+        board.types[:] = initial_types
+
+    changes = []
+    for frame_index, rows in log.frames():
+        if remap:
+            grid_x, grid_y = remap_to_grid(rows)
+            on_board = (grid_x >= 0) & (grid_x < 5) & (grid_y >= 0) & (grid_y < 5)
+            rows, grid_x, grid_y = rows[on_board], grid_x[on_board], grid_y[on_board]
+        else:
+            grid_x, grid_y = rows['grid_x'], rows['grid_y']
+
+        xs, ys, old_types, new_types = board.apply(grid_x, grid_y, rows['class'], rows['confidence'])
+        for x, y, old_type, new_type in zip(xs.tolist(), ys.tolist(), old_types.tolist(), new_types.tolist()):
+            changes.append({'x': x, 'y': y, 'old_type': old_type, 'new_type': new_type, 'frame': frame_index})
+    return changes, board.types.copy()
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay recorded detection logs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    info_parser = subparsers.add_parser("info", help="Summarize a detection log")
+    info_parser.add_argument("log")
+
+    replay_parser = subparsers.add_parser("replay", help="Re-run change tracking over a log")
+    replay_parser.add_argument("log")
+    replay_parser.add_argument("--threshold", type=int, default=3, help="Votes needed to confirm a change")
+    replay_parser.add_argument("--decay", type=float, default=1.0, help="Per-detection decay of pending votes")
+    replay_parser.add_argument("--confidence-weighted", action="store_true", help="Weight votes by confidence")
+    replay_parser.add_argument("--remap", action="store_true",
+                               help="Recompute cells from the boxes instead of using the recorded ones")
+    replay_parser.add_argument("--json", help="Write the confirmed changes to this file")
+
+    args = parser.parse_args()
+    if args.command == "replay" and not 0 < args.decay <= 1:
+        parser.error("--decay must be greater than 0 and at most 1")
+    log = DetectionLog(args.log)
+
+    if args.command == "info":
+        detections = log.rows[log.rows['class'] >= 0]
+        print(f"{len(log)} sampled frames, {len(detections)} detections")
+        if len(log):
+            frames = log.frame_indices()
+            print(f"Frames {int(frames[0])} to {int(frames[-1])}, "
+                  f"{float(log.rows['timestamp'][-1] - log.rows['timestamp'][0]):.1f}s recorded")
+        return
+
+    start_time = time.perf_counter()
+    changes, final_types = replay(log, args.threshold, args.decay, args.confidence_weighted, args.remap)
+    elapsed = time.perf_counter() - start_time
+
+    for change in changes:
+        print(f"Frame {change['frame']}: cell ({change['x']}, {change['y']}) "
+              f"{change['old_type']} -> {change['new_type']}")
+    print(f"Replayed {len(log)} frames in {elapsed * 1000:.1f}ms")
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump({'changes': changes, 'final_types': final_types.tolist()}, json_file, indent=2)
+
+if __name__ == "__main__":
+    main()
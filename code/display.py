@@ -0,0 +1,108 @@
+import threading
+import time
+import cv2
+import numpy as np
+from metrics import metrics
+
+class DisplayStage:
+    """
+    Prepares video frames for display on its own thread. The capture loop only
+    hands over a reference to each decoded frame; the stage converts and
+    downscales just the newest one per display tick, into preallocated
+    buffers.
+    """
+    def __init__(self, size=(640, 480), fps=30):
+        self.width, self.height = size
+        self.fps = fps
+        self.interval = 1.0 / fps
+
+        self.condition = threading.Condition()
+        self.latest_frame = None
+        self.frames_offered = 0
+        self.frames_shown = 0
+        self.next_claim_time = 0.0
+
+        # Three RGB buffers: one published, one held by the UI, one being written
+        self.scaled_frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.buffers = [np.empty((self.height, self.width, 3), dtype=np.uint8) for _ in range(3)]
+        self.published_index = None
+        self.held_index = None
+
+        self.is_running = True
+        self.worker = threading.Thread(target=self._run)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def claim_frame(self):
+        """
+        Returns True at most once per display interval. Lets readers skip
+        decoding frames the display would drop anyway.
+        """
+        now = time.perf_counter()
+        if now < self.next_claim_time:
+            return False
+        self.next_claim_time = max(self.next_claim_time + self.interval, now)
+        return True
+
+    def offer(self, frame):
+        # Called for every decoded BGR frame, replaces any frame not yet shown
+        with self.condition:
+            if self.latest_frame is not None:
+                metrics.increment("display_frames_dropped")
+            self.latest_frame = frame
+            self.frames_offered += 1
+            self.condition.notify()
+
+    def take(self):
+        """
+        Returns the newest prepared RGB frame, or None when nothing new was
+        prepared since the last call. The buffer stays valid until release().
+        """
+        with self.condition:
+            if self.published_index is None:
+                return None
+            self.held_index = self.published_index
+            self.published_index = None
+            return self.buffers[self.held_index]
+
+    def release(self):
+        with self.condition:
+            self.held_index = None
+
+    def close(self):
+        with self.condition:
+            self.is_running = False
+            self.condition.notify()
+        self.worker.join()
+
+    def _run(self):
+        next_tick = time.perf_counter()
+        while True:
+            with self.condition:
+                while self.is_running and self.latest_frame is None:
+                    self.condition.wait()
+                if not self.is_running:
+                    return
+                frame = self.latest_frame
+                self.latest_frame = None
+                write_index = next(
+                    index for index in range(3)
+                    if index != self.published_index and index != self.held_index
+                )
+
+            # Downscale first so the color conversion touches fewer pixels
+            with metrics.timer("display_convert"):
+                cv2.resize(frame, (self.width, self.height), dst=self.scaled_frame, interpolation=cv2.INTER_AREA)
+                cv2.cvtColor(self.scaled_frame, cv2.COLOR_BGR2RGB, dst=self.buffers[write_index])
+
+            with self.condition:
+                self.published_index = write_index
+                self.frames_shown += 1
+
+            # Prepare at most one frame per display tick
+            next_tick += self.interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.perf_counter()
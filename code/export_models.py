@@ -0,0 +1,175 @@
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+import cv2
+import numpy as np
+from ultralytics import YOLO
+from backends import BACKENDS, resolve_model_path
+from yolo import GridDetector
+
+IMAGE_PATTERNS = ("*.png", "*.jpg", "*.jpeg", "*.bmp")
+
+def list_images(image_dir):
+    image_paths = []
+    for pattern in IMAGE_PATTERNS:
+        image_paths.extend(glob.glob(os.path.join(image_dir, pattern)))
+    return sorted(image_paths)
+
+def letterbox(image, size):
+    # Same resize-and-pad as the ultralytics predictor, returns an NCHW float tensor
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    resized = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_LINEAR)
+    padded = np.full((size, size, 3), 114, dtype=np.uint8)
+    top = (size - resized.shape[0]) // 2
+    left = (size - resized.shape[1]) // 2
+    padded[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    rgb = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB)
+    return (rgb.transpose(2, 0, 1)[np.newaxis] / 255.0).astype(np.float32)
+
+def quantize_onnx(onnx_path, output_path, calibration_images, imgsz):
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    import onnxruntime
+
+    input_name = onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class ImageCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self.image_paths = iter(calibration_images)
+
+        def get_next(self):
+            for image_path in self.image_paths:
+                image = cv2.imread(image_path)
+                if image is not None:
+                    return {input_name: letterbox(image, imgsz)}
+            return None
+
+    quantize_static(
+        onnx_path,
+        output_path,
+        ImageCalibrationReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8
+    )
+
+def export_model(model_path, backend, int8=False, calibration_dir=None, imgsz=640):
+    """
+    Exports the .pt weights for a backend to the path load_model expects.
+    INT8 export calibrates the activations on the images of calibration_dir.
+    """
+    target_path = resolve_model_path(model_path, backend, int8)
+    calibration_images = list_images(calibration_dir) if calibration_dir else []
+    if int8 and not calibration_images:
+        raise ValueError("INT8 export needs --calibration with a directory of board images")
+
+    model = YOLO(model_path)
+    if backend == "onnx":
+        # Dynamic axes so batched inference works on the exported model
+        onnx_path = model.export(format="onnx", imgsz=imgsz, dynamic=True)
+        if int8:
+            quantize_onnx(onnx_path, target_path, calibration_images, imgsz)
+            return target_path
+        exported_path = onnx_path
+    else:
+        with tempfile.TemporaryDirectory() as data_dir:
+            data_options = {}
+            if int8:
+                # ultralytics calibrates openvino INT8 weights from a dataset yaml
+                data_yaml = os.path.join(data_dir, "calibration.yaml")
+                with open(data_yaml, "w") as yaml_file:
+                    yaml_file.write(f"path: {os.path.abspath(calibration_dir)}\ntrain: .\nval: .\n")
+                    yaml_file.write("names:\n")
+                    for class_index, class_name in model.names.items():
+                        yaml_file.write(f"  {class_index}: {class_name}\n")
+                data_options = {"int8": True, "data": data_yaml}
+            exported_path = model.export(format="openvino", imgsz=imgsz, dynamic=True, **data_options)
+
+    if os.path.normpath(exported_path) != os.path.normpath(target_path):
+        if os.path.isdir(target_path):
+            shutil.rmtree(target_path)
+        shutil.move(exported_path, target_path)
+    return target_path
+
+def _boxes_by_cell(detections):
+    boxes = {}
+    for d in detections:
+        boxes.setdefault((d['grid_x'], d['grid_y'], d['class']), []).append(d['bbox'])
+    # Duplicates within one cell are rare; keep them in a stable order
+    return {key: sorted(cell_boxes) for key, cell_boxes in boxes.items()}
+
+def compare_backends(model_path, image_dir, backends, int8=False, runs=3):
+    """
+    Runs GridDetector on every backend over the same images and reports the
+    mean latency and how far each backend's detections are from PyTorch.
+    """
+    images = [image for image in (cv2.imread(path) for path in list_images(image_dir)) if image is not None]
+    if not images:
+        raise ValueError(f"No images found in {image_dir}")
+
+    reference = GridDetector(model_path)
+    reference_detections = [reference.process_image(image) for image in images]
+
+    for backend in backends:
+        use_int8 = int8 and backend != "pytorch"
+        try:
+            detector = GridDetector(model_path, backend, use_int8)
+        except FileNotFoundError as e:
+            print(f"{backend}: skipped ({e})")
+            continue
+
+        # Warm-up before timing
+        detector.process_image(images[0])
+        start_time = time.perf_counter()
+        for _ in range(runs):
+            backend_detections = [detector.process_image(image) for image in images]
+        latency = (time.perf_counter() - start_time) / (runs * len(images))
+
+        cell_mismatches = 0
+        max_box_offset = 0.0
+        for expected, actual in zip(reference_detections, backend_detections):
+            expected_cells = sorted((d['grid_x'], d['grid_y'], d['class']) for d in expected)
+            actual_cells = sorted((d['grid_x'], d['grid_y'], d['class']) for d in actual)
+            if expected_cells != actual_cells:
+                cell_mismatches += 1
+                continue
+            # Pair boxes by cell and class, so a small shift cannot reorder them
+            actual_by_cell = _boxes_by_cell(actual)
+            for key, expected_boxes in _boxes_by_cell(expected).items():
+                offset = np.abs(np.array(expected_boxes) - np.array(actual_by_cell[key])).max()
+                max_box_offset = max(max_box_offset, float(offset))
+
+        label = f"{backend}{' int8' if use_int8 else ''}"
+        print(f"{label}: {latency * 1000:.1f} ms/image, "
+              f"{cell_mismatches}/{len(images)} images with different cells, "
+              f"max box offset {max_box_offset:.2f}px")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the YOLO weights to faster CPU backends")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export .pt weights to another backend")
+    export_parser.add_argument("model", help="Path to the .pt weights, e.g. models/grid_model.pt")
+    export_parser.add_argument("--format", choices=BACKENDS[1:], required=True, help="Target backend")
+    export_parser.add_argument("--int8", action="store_true", help="Quantize the weights to INT8")
+    export_parser.add_argument("--calibration", help="Directory of board images for INT8 calibration")
+    export_parser.add_argument("--imgsz", type=int, default=640, help="Model input size")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare backends for speed and output")
+    compare_parser.add_argument("model", help="Path to the .pt weights")
+    compare_parser.add_argument("images", help="Directory of board images")
+    compare_parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    compare_parser.add_argument("--int8", action="store_true", help="Compare the INT8 exports")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        target_path = export_model(args.model, args.format, args.int8, args.calibration, args.imgsz)
+        print(f"Exported {args.model} to {target_path}")
+    else:
+        compare_backends(args.model, args.images, args.backends, args.int8)
+
+if __name__ == "__main__":
+    main()
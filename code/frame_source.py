@@ -0,0 +1,302 @@
+import os
+import threading
+import time
+from collections import deque
+import cv2
+from metrics import metrics
+
+def parse_source(source):
+    # Device indices come in as digits, everything else is a path or URL
+    return int(source) if source.isdigit() else source
+
+def is_live_source(source):
+    # Cameras and network streams, as opposed to a video file on disk
+    return not (isinstance(source, str) and os.path.exists(source))
+
+class LatestFrameCapture:
+    """
+    Reads a live source on its own thread and keeps only the newest frame,
+    so consumers never see frames that waited in a capture buffer. Offers
+    the VideoCapture methods PrefetchReader and the apps use.
+    """
+    def __init__(self, source, width=None, height=None, fps=None):
+        self.cap = cv2.VideoCapture(source)
+        if width:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height:
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+        # Not every backend honours this, the capture thread covers the rest
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self.condition = threading.Condition()
+        self.frame = None
+        self.frame_number = 0
+        self.returned_number = 0
+        # Total seconds grab() waited for a new frame, not a decode cost
+        self.blocked_seconds = 0.0
+        self.is_finished = not self.cap.isOpened()
+        self.is_running = True
+
+        self.worker = threading.Thread(target=self._run)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def _run(self):
+        try:
+            while self.is_running:
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                with self.condition:
+                    self.frame = frame
+                    self.frame_number += 1
+                    self.condition.notify_all()
+        finally:
+            with self.condition:
+                self.is_finished = True
+                self.condition.notify_all()
+
+    def grab(self):
+        """
+        Waits for a frame newer than the last one retrieved.
+        """
+        with self.condition:
+            start_time = time.perf_counter()
+            while self.frame_number == self.returned_number and not self.is_finished:
+                self.condition.wait()
+            self.blocked_seconds += time.perf_counter() - start_time
+            if self.frame_number == self.returned_number:
+                return False
+            if self.frame_number > self.returned_number + 1:
+                metrics.increment("capture_frames_dropped", self.frame_number - self.returned_number - 1)
+            self.returned_number = self.frame_number
+            return True
+
+    def retrieve(self):
+        with self.condition:
+            return self.frame is not None, self.frame
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        # Live sources cannot seek
+        return False
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        with self.condition:
+            self.is_running = False
+        self.worker.join(timeout=1.0)
+        self.cap.release()
+
+class PacedFileCapture:
+    """
+    Video file played back at its own frame rate when realtime is set, as
+    if it came from a camera, or as fast as it decodes otherwise.
+    """
+    def __init__(self, path, realtime=True):
+        self.cap = cv2.VideoCapture(path)
+        self.realtime = realtime
+        self.frame_interval = 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or 30.0)
+        self.start_time = None
+        self.position = 0
+        # Total seconds spent waiting for frames to be due, not a decode cost
+        self.blocked_seconds = 0.0
+
+    def _wait_until_due(self):
+        if self.start_time is None:
+            self.start_time = time.perf_counter() - self.position * self.frame_interval
+            return
+        delay = self.start_time + self.position * self.frame_interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+            self.blocked_seconds += delay
+
+    def grab(self):
+        if self.realtime:
+            self._wait_until_due()
+        grabbed = self.cap.grab()
+        if grabbed:
+            self.position += 1
+        return grabbed
+
+    def retrieve(self):
+        return self.cap.retrieve()
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        # Seeking keeps the playback clock, the target frame is due at its own time
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.position = int(value)
+            if self.realtime:
+                self._wait_until_due()
+        return self.cap.set(prop, value)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+def open_source(source, width=None, height=None, fps=None, realtime=True):
+    """
+    Opens a file path, device index or stream URL. Live sources get a
+    latest-frame capture thread with the requested resolution and FPS;
+    files are paced to real time, or run at full speed without realtime.
+    """
+    if isinstance(source, str):
+        source = parse_source(source)
+    if is_live_source(source):
+        return LatestFrameCapture(source, width, height, fps)
+    return PacedFileCapture(source, realtime)
+
+class PrefetchReader:
+    """
+    Reads a video on a background thread into a bounded ring buffer. Every
+    frame is grabbed so the stream position stays exact, but only the frames
+    accepted by wanted are decoded. On files with a large sampling stride the
+    reader seeks straight to the next sampled frame instead.
+
+    Frame indices are 1-based, matching BoardTracker.frame_count.
+    With freshest, iteration skips to the newest buffered frame so a slow
+    consumer never works on a stale one.
+    """
+    def __init__(self, source, wanted=1, buffer_size=8, seek_threshold=30, start_index=0, seekable=None,
+                 freshest=False):
+        # A path or device index, or an already opened capture
+        if isinstance(source, (str, int)):
+            self.cap = cv2.VideoCapture(source)
+        else:
+            self.cap = source
+        if seekable is None:
+            seekable = (isinstance(source, PacedFileCapture)
+                        or isinstance(source, str) and os.path.exists(source))
+
+        # wanted is a sampling stride or a callable taking the frame index
+        if callable(wanted):
+            self.stride = None
+            self.wanted = wanted
+        else:
+            self.stride = max(1, int(wanted))
+            self.wanted = lambda frame_index: frame_index % self.stride == 0
+        self.use_seek = seekable and self.stride is not None and self.stride >= seek_threshold
+
+        self.buffer = deque()
+        self.buffer_size = buffer_size
+        self.condition = threading.Condition()
+        self.frame_index = start_index
+        self.frames_grabbed = 0
+        self.frames_decoded = 0
+        self.freshest = freshest
+        # Running averages of the seconds spent per grab and per decode
+        self.grab_seconds = None
+        self.decode_seconds = None
+        self.is_finished = False
+        self.is_running = True
+
+        self.worker = threading.Thread(target=self._run)
+        self.worker.daemon = True
+        self.worker.start()
+
+    @staticmethod
+    def _average(average, value):
+        return value if average is None else average + 0.1 * (value - average)
+
+    def _blocked_seconds(self):
+        # Time paced and live captures spend waiting for a frame, left out of
+        # the grab and decode costs the scheduler budgets with
+        return getattr(self.cap, 'blocked_seconds', 0.0)
+
+    def _read_next(self):
+        if self.use_seek:
+            # CAP_PROP_POS_FRAMES is the 0-based index of the next frame to decode
+            next_index = (self.frame_index // self.stride + 1) * self.stride
+            start_time, start_blocked = time.perf_counter(), self._blocked_seconds()
+            with metrics.timer("seek_decode"):
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, next_index - 1)
+                ret, frame = self.cap.read()
+            self.decode_seconds = self._average(
+                self.decode_seconds, time.perf_counter() - start_time - (self._blocked_seconds() - start_blocked))
+            self.grab_seconds = 0.0
+            self.frame_index = next_index
+            return ret, frame
+
+        while True:
+            start_time, start_blocked = time.perf_counter(), self._blocked_seconds()
+            with metrics.timer("grab"):
+                grabbed = self.cap.grab()
+            self.grab_seconds = self._average(
+                self.grab_seconds, time.perf_counter() - start_time - (self._blocked_seconds() - start_blocked))
+            if not grabbed:
+                return False, None
+            self.frame_index += 1
+            self.frames_grabbed += 1
+            if self.wanted(self.frame_index):
+                start_time = time.perf_counter()
+                with metrics.timer("decode"):
+                    ret, frame = self.cap.retrieve()
+                self.decode_seconds = self._average(self.decode_seconds, time.perf_counter() - start_time)
+                return ret, frame
+            metrics.increment("frames_not_decoded")
+
+    def _run(self):
+        try:
+            while self.is_running:
+                ret, frame = self._read_next()
+                if not ret:
+                    break
+                self.frames_decoded += 1
+
+                with self.condition:
+                    if len(self.buffer) >= self.buffer_size:
+                        metrics.increment("reader_buffer_full")
+                    while self.is_running and len(self.buffer) >= self.buffer_size:
+                        self.condition.wait()
+                    self.buffer.append((self.frame_index, frame))
+                    self.condition.notify_all()
+        finally:
+            with self.condition:
+                self.is_finished = True
+                self.condition.notify_all()
+
+    def __iter__(self):
+        """
+        Yields (frame_index, frame) pairs in order until the video ends.
+        """
+        while True:
+            with self.condition, metrics.timer("reader_wait"):
+                while not self.buffer and not self.is_finished:
+                    self.condition.wait()
+                if not self.buffer:
+                    return
+                if self.freshest and len(self.buffer) > 1:
+                    metrics.increment("stale_frames_dropped", len(self.buffer) - 1)
+                    while len(self.buffer) > 1:
+                        self.buffer.popleft()
+                item = self.buffer.popleft()
+                self.condition.notify_all()
+            yield item
+
+    def close(self):
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+        self.worker.join()
+        self.cap.release()
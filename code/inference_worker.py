@@ -0,0 +1,204 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from yolo import boxes_to_detections
+from metrics import metrics
+
+def configure_thread_budget(threads):
+    """
+    Caps the CPU threads OpenCV and torch use in this process.
+    """
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+# Detector of a pool worker process, loaded once by init_pool_worker
+_pool_detector = None
+
+def init_pool_worker(detector_class, model_path, backend, int8, threads):
+    """
+    ProcessPoolExecutor initializer: gives the worker its share of the cores
+    and loads one detector, returned by pool_detector in that process.
+    """
+    global _pool_detector
+    configure_thread_budget(threads)
+    _pool_detector = detector_class(model_path, backend, int8)
+
+def pool_detector():
+    return _pool_detector
+
+class SharedFrameRing:
+    """
+    Fixed-size frame slots in one shared memory block. The parent copies a
+    frame into a slot and sends only (slot, shape) to the worker, which
+    reads it in place.
+    """
+    def __init__(self, slot_count, slot_bytes, name=None):
+        self.slot_count = slot_count
+        self.slot_bytes = slot_bytes
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=slot_count * slot_bytes)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.next_slot = 0
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def view(self, slot, shape):
+        offset = slot * self.slot_bytes
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.memory.buf, offset=offset)
+
+    def write(self, frame):
+        slot = self.next_slot
+        self.next_slot = (self.next_slot + 1) % self.slot_count
+        np.copyto(self.view(slot, frame.shape), frame)
+        return slot
+
+    def close(self, unlink=False):
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+def _worker_main(model_path, backend, int8, threads, requests, responses):
+    configure_thread_budget(threads)
+    try:
+        from yolo import GridDetector
+        start_time = time.perf_counter()
+        detector = GridDetector(model_path, backend, int8)
+        detector.predict([np.zeros((480, 640, 3), dtype=np.uint8)])
+    except Exception as e:
+        responses.put(("error", f"{type(e).__name__}: {e}"))
+        return
+    responses.put(("ready", time.perf_counter() - start_time))
+
+    ring = None
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        if message[0] == "ring":
+            # The parent allocated a larger ring, attach to it instead
+            if ring is not None:
+                ring.close()
+            _, name, slot_count, slot_bytes = message
+            ring = SharedFrameRing(slot_count, slot_bytes, name)
+            continue
+
+        _, slots, imgsz = message
+        try:
+            images = [ring.view(slot, shape) for slot, shape in slots]
+            start_time = time.perf_counter()
+            all_boxes = detector.predict(images, imgsz)
+            responses.put(("boxes", all_boxes, time.perf_counter() - start_time))
+        except Exception as e:
+            responses.put(("error", f"{type(e).__name__}: {e}"))
+
+    if ring is not None:
+        ring.close()
+
+class RemoteGridDetector:
+    """
+    GridDetector running in a separate process. Frames go through a shared
+    memory ring and boxes come back as compact (n, 6) arrays, so neither
+    side pays for pickling images and the detector's Python pre- and
+    post-processing stays off this process's GIL. Calls are serialized.
+    """
+    def __init__(self, model_path, backend="pytorch", int8=False, slot_count=8,
+                 inference_threads=None, local_threads=None):
+        cpu_count = os.cpu_count() or 1
+        if local_threads is None:
+            local_threads = max(1, cpu_count // 4)
+        if inference_threads is None:
+            inference_threads = max(1, cpu_count - local_threads)
+        configure_thread_budget(local_threads)
+
+        # Spawn rather than fork, this process already runs threads
+        context = multiprocessing.get_context("spawn")
+        self.requests = context.Queue()
+        self.responses = context.Queue()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(model_path, backend, int8, inference_threads, self.requests, self.responses)
+        )
+        self.process.daemon = True
+        self.process.start()
+
+        self.slot_count = slot_count
+        self.ring = None
+        self.lock = threading.Lock()
+
+        status = self._receive()
+        if status[0] == "error":
+            self.process.join()
+            raise RuntimeError(f"Inference worker failed to start: {status[1]}")
+        print(f"Inference worker loaded {model_path} in {status[1]:.2f}s "
+              f"({inference_threads} threads, {local_threads} local)")
+
+    def _receive(self):
+        # Wait for the worker, without hanging if it died
+        while True:
+            try:
+                return self.responses.get(timeout=1.0)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    return ("error", f"worker exited with code {self.process.exitcode}")
+
+    def _ensure_ring(self, frame_bytes):
+        if self.ring is not None and self.ring.slot_bytes >= frame_bytes:
+            return
+        if self.ring is not None:
+            self.ring.close(unlink=True)
+        self.ring = SharedFrameRing(self.slot_count, frame_bytes)
+        self.requests.put(("ring", self.ring.name, self.slot_count, frame_bytes))
+
+    def predict(self, game_images, imgsz=None):
+        """
+        Same as GridDetector.predict, run in the worker process.
+        """
+        if not game_images:
+            return []
+
+        all_boxes = []
+        with self.lock:
+            self._ensure_ring(max(image.nbytes for image in game_images))
+            # Batches larger than the ring go in several calls
+            for start in range(0, len(game_images), self.slot_count):
+                chunk = [np.ascontiguousarray(image) for image in game_images[start:start + self.slot_count]]
+                slots = [(self.ring.write(image), image.shape) for image in chunk]
+                with metrics.timer("remote_inference"):
+                    self.requests.put(("predict", slots, imgsz))
+                    response = self._receive()
+                if response[0] == "error":
+                    raise RuntimeError(f"Inference worker error: {response[1]}")
+                metrics.observe("yolo", response[2])
+                metrics.increment("inference_images", len(chunk))
+                all_boxes.extend(response[1])
+        return all_boxes
+
+    def process_image(self, game_image):
+        return self.process_batch([game_image])[0]
+
+    def process_batch(self, game_images, imgsz=None):
+        return [
+            boxes_to_detections(boxes, game_image.shape)
+            for game_image, boxes in zip(game_images, self.predict(game_images, imgsz))
+        ]
+
+    def close(self):
+        with self.lock:
+            if self.process.is_alive():
+                self.requests.put(None)
+                self.process.join(timeout=5)
+            if self.ring is not None:
+                self.ring.close(unlink=True)
+                self.ring = None
@@ -0,0 +1,173 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from backends import BACKENDS, resolve_model_path
+from inference_worker import init_pool_worker, pool_detector
+from model_registry import KEY_MODEL_PATH
+from yolo import KeyDetector
+
+KEY_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def model_key(model_path, backend="pytorch", int8=False):
+    """
+    Identifies the weights a grid is read with, so a different model,
+    backend or precision does not reuse another model's cached grids.
+    """
+    backend_path = resolve_model_path(model_path, backend, int8)
+    key = f"{backend}:{'int8' if int8 else 'fp32'}:{os.path.abspath(backend_path)}"
+    if os.path.exists(backend_path):
+        # Weights replaced in place invalidate the cache as well
+        weights_stat = os.stat(backend_path)
+        key += f":{weights_stat.st_size}:{weights_stat.st_mtime_ns}"
+    return key
+
+def find_key_images(directory):
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(KEY_IMAGE_EXTENSIONS)
+    )
+
+def _scan_image_data(image_data):
+    key_image = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if key_image is None:
+        raise ValueError("Could not decode key image")
+    return pool_detector().process_key_array(key_image)
+
+class KeyCardCache:
+    """
+    Key grids keyed on the SHA-256 of the image file, kept apart per model
+    (see model_key) and persisted to JSON so a re-scan only runs the model
+    on new or changed cards.
+    """
+    def __init__(self, cache_path=None, model_key=""):
+        self.cache_path = cache_path
+        # {model key: {image hash: grid}}
+        self.models = {}
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path) as cache_file:
+                    self.models = json.load(cache_file)
+            except (OSError, ValueError) as e:
+                print(f"Could not load key card cache: {e}")
+            if not isinstance(self.models, dict) or not all(isinstance(entries, dict) for entries in self.models.values()):
+                # Written before grids were kept per model
+                self.models = {}
+        self.entries = self.models.setdefault(model_key, {})
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, grid):
+        self.entries[key] = grid
+
+    def save(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, 'w') as cache_file:
+                json.dump(self.models, cache_file)
+        except OSError as e:
+            print(f"Could not save key card cache: {e}")
+
+def scan_key_cards(image_paths, model_path=KEY_MODEL_PATH, backend="pytorch", int8=False,
+                   workers=None, cache_path=None):
+    """
+    Reads the key grid of every image, running the cache misses in a process
+    pool. Returns {path: {'hash', 'grid', 'cached'}} entries, or
+    {path: {'error'}} for images that could not be read.
+    """
+    cache = KeyCardCache(cache_path, model_key(model_path, backend, int8))
+    results = {}
+    pending = {}
+
+    # Each file is read once: the bytes are hashed here and decoded in a worker
+    for image_path in image_paths:
+        try:
+            with open(image_path, 'rb') as image_file:
+                image_data = image_file.read()
+        except OSError as e:
+            results[image_path] = {'error': str(e)}
+            continue
+
+        key = content_hash(image_data)
+        grid = cache.get(key)
+        if grid is not None:
+            results[image_path] = {'hash': key, 'grid': grid, 'cached': True}
+        else:
+            pending[image_path] = (key, image_data)
+
+    if pending:
+        # Fail once here rather than in every worker's initializer
+        backend_path = resolve_model_path(model_path, backend, int8)
+        if not os.path.exists(backend_path):
+            raise FileNotFoundError(f"No {backend} weights at {backend_path}")
+
+        workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_pool_worker,
+                                 initargs=(KeyDetector, model_path, backend, int8, threads)) as executor:
+            futures = {
+                image_path: executor.submit(_scan_image_data, image_data)
+                for image_path, (_, image_data) in pending.items()
+            }
+            for image_path, future in futures.items():
+                key = pending[image_path][0]
+                try:
+                    grid = future.result()
+                except Exception as e:
+                    results[image_path] = {'error': str(e)}
+                    continue
+                cache.put(key, grid)
+                results[image_path] = {'hash': key, 'grid': grid, 'cached': False}
+        cache.save()
+
+    return {image_path: results[image_path] for image_path in image_paths}
+
+def main():
+    parser = argparse.ArgumentParser(description="Read the key grids of a directory of key card images")
+    parser.add_argument("directory", help="Folder of key card images")
+    parser.add_argument("--model", default=KEY_MODEL_PATH, help="Key detection model")
+    parser.add_argument("--backend", choices=BACKENDS, default="pytorch", help="Inference backend")
+    parser.add_argument("--int8", action="store_true", help="Use INT8 quantized weights (onnx/openvino)")
+    parser.add_argument("--workers", type=int, help="Worker processes, defaults to the CPU count")
+    parser.add_argument("--cache", default="key_cache.json", help="File caching grids by image content")
+    parser.add_argument("--output", help="Write all grids to this JSON file")
+    args = parser.parse_args()
+
+    image_paths = find_key_images(args.directory)
+    if not image_paths:
+        print(f"Error: No key card images in {args.directory}")
+        return
+
+    start_time = time.perf_counter()
+    try:
+        results = scan_key_cards(image_paths, args.model, args.backend, args.int8, args.workers, args.cache)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}")
+        return
+    elapsed = time.perf_counter() - start_time
+
+    for image_path, result in results.items():
+        if 'error' in result:
+            print(f"{image_path}: Error: {result['error']}")
+        else:
+            rows = " / ".join("".join(str(cell) for cell in row) for row in result['grid'])
+            print(f"{image_path}: {rows}{' (cached)' if result['cached'] else ''}")
+
+    scanned = sum(1 for result in results.values() if result.get('cached') is False)
+    print(f"Read {len(results)} key cards ({scanned} scanned) in {elapsed:.2f}s")
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+
+if __name__ == "__main__":
+    main()
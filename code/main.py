@@ -1,22 +1,40 @@
+import argparse
 import tkinter as tk
 from tkinter import filedialog
 from PIL import Image, ImageTk
 import cv2
 import threading
 import queue
+import time
 from ui_components import GameGrid, KeyGrid
-from ocr_handler import OCRHandler
-from yolo import GridDetector, KeyDetector
+from backends import BACKENDS
+from model_registry import registry
+from board_tracker import BoardTracker
+from display import DisplayStage
+from frame_source import PrefetchReader, open_source, is_live_source, parse_source
+from metrics import metrics, add_profiling_arguments, configure_profiling
+from motion import MotionGate
+from registration import BoardRegistration
+from scheduler import FrameScheduler
 
 class CodeNamesApp:
-    def __init__(self, root):
+    def __init__(self, root, source="resources/game_video.mp4", capture_options=None, realtime=True,
+                 latency_target=None):
         self.root = root
         self.root.title("CodeNames Game")
+        # Video file, camera index or stream URL, see open_source
+        self.source = source
+        self.capture_options = capture_options or {}
+        self.realtime = realtime
+        self.latency_target = latency_target
         
         # Initialize role and team variables
         self.role = None
         self.team = None
         
+        # Load the models in the background while the role is being chosen
+        self.model_loader = registry.preload()
+        
         # Show role selection first
         self.show_role_selection()
     
@@ -78,7 +96,7 @@ class CodeNamesApp:
         if file_path:
             try:
                 # Process key image
-                key_detector = KeyDetector("models/key_model.pt")
+                key_detector = registry.get_key_detector()
                 key_grid_values = key_detector.process_key_image(file_path)
                 
                 self.initialize_game(key_grid_values)
@@ -91,9 +109,15 @@ class CodeNamesApp:
         for widget in self.root.winfo_children():
             widget.destroy()
         
+        # Wait for the background model loading without blocking the UI
+        if self.model_loader.is_alive() and not registry.is_game_ready():
+            tk.Label(self.root, text="Loading models...", font=('Arial', 14, 'bold')).pack(padx=20, pady=20)
+            self.root.after(100, lambda: self.initialize_game(key_grid_values))
+            return
+        
         # Initialize components
-        self.detector = GridDetector("models/grid_model.pt")
-        self.ocr = OCRHandler()
+        self.detector = registry.get_grid_detector()
+        self.ocr = registry.get_ocr()
         
         # Create info frame at the top
         info_frame = tk.Frame(self.root, pady=10)
@@ -121,7 +145,10 @@ class CodeNamesApp:
         self.video_frame = tk.Frame(self.main_frame)
         self.video_frame.pack(side=tk.LEFT, padx=10, pady=10)
         
-        self.video_label = tk.Label(self.video_frame)
+        # Single Tk image, repainted in place for every displayed frame
+        self.display_size = (640, 480)
+        self.video_photo = ImageTk.PhotoImage("RGB", self.display_size)
+        self.video_label = tk.Label(self.video_frame, image=self.video_photo)
         self.video_label.pack()
         
         # Create right panel for grids
@@ -143,20 +170,33 @@ class CodeNamesApp:
         self.cap = None
         self.processing_thread = None
         self.is_running = False
-        self.frame_queue = queue.Queue(maxsize=1)
-        self.detection_queue = queue.Queue(maxsize=1)
+        self.display = None
+        self.DISPLAY_FPS = 30
+        self.change_queue = queue.Queue()
         
-        # Tracking variables for card changes
-        self.change_tracking = {}
+        # Headless engine that owns detection and change tracking
         self.CHANGE_THRESHOLD = 3
         self.FRAMES_TO_SKIP = 5
-        self.frame_count = 0
+        
+        # Adapts FRAMES_TO_SKIP to the host when a latency target is set
+        self.scheduler = None
+        if self.latency_target:
+            self.scheduler = FrameScheduler(self.latency_target, change_threshold=self.CHANGE_THRESHOLD)
+        self.tracker = BoardTracker(
+            self.detector,
+            self.ocr,
+            change_threshold=self.CHANGE_THRESHOLD,
+            frames_to_skip=self.FRAMES_TO_SKIP,
+            motion_gate=MotionGate(),
+            registration=BoardRegistration(),
+            scheduler=self.scheduler
+        )
         
         # Start the game
         self.start_game()
     
     def start_game(self):
-        self.cap = cv2.VideoCapture("resources/game_video.mp4") # Source video file 
+        self.cap = open_source(self.source, realtime=self.realtime, **self.capture_options)
         ret, frame = self.cap.read()
         if ret:
             self.initialize_grid_with_cards(frame)
@@ -165,165 +205,105 @@ class CodeNamesApp:
             print("Error: Could not read initial frame")
     
     def initialize_grid_with_cards(self, frame):
-        results = self.detector.model(frame)
-        
-        for result in results:
-            img_height, img_width = result.orig_img.shape[:2]
-            boxes = result.boxes
-            
-            for box in boxes:
-                x = box.xywh[0][0].item()
-                y = box.xywh[0][1].item()
-                w = box.xywh[0][2].item()
-                h = box.xywh[0][3].item()
-                
-                x1 = x - w/2
-                y1 = y - h/2
-                x2 = x + w/2
-                y2 = y + h/2
-                
-                grid_x = int((x / img_width) * 5)
-                grid_y = int((y / img_height) * 5)
-                
-                if 0 <= grid_x < 5 and 0 <= grid_y < 5:
-                    text = self.ocr.get_card_text(frame, [x1, y1, x2, y2])
-                    if text:
-                        self.grid.update_cell(grid_x, grid_y, 0, text)
+        for cell in self.tracker.initialize(frame):
+            self.grid.update_cell(cell['x'], cell['y'], 0, cell['text'])
     
     def start_video_processing(self):
         self.is_running = True
+        self.display = DisplayStage(self.display_size, self.DISPLAY_FPS)
+        
+        # Decode only the frames sampled for detection or due for display
+        sampled = self.tracker.sampling_rule()
+        self.reader = PrefetchReader(
+            self.cap,
+            wanted=lambda frame_index: sampled(frame_index) or self.display.claim_frame(),
+            start_index=1,
+            freshest=self.realtime or is_live_source(parse_source(self.source))
+        )
+        if self.scheduler is not None:
+            self.scheduler.source_fps = self.cap.get(cv2.CAP_PROP_FPS) or self.scheduler.source_fps
+            self.scheduler.watch(self.reader)
         self.processing_thread = threading.Thread(target=self.process_video)
         self.processing_thread.daemon = True
         self.processing_thread.start()
         self.update_ui()
     
     def process_video(self):
-        while self.is_running:
-            ret, frame = self.cap.read()
-            if not ret:
+        for frame_index, frame in self.reader:
+            if not self.is_running:
                 break
             
-            self.frame_count += 1
-            
-            # Convert frame for display
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            if not self.frame_queue.full():
-                self.frame_queue.put(rgb_frame)
-            
-            # Skip YOLO processing for smoother video
-            if self.frame_count % (self.FRAMES_TO_SKIP + 1) != 0:
-                continue
-            
-            # Process frame with YOLO (but don't use for display)
-            results = self.detector.model(frame)
+            # Hand the frame to the display stage, it converts only what it shows
+            self.display.offer(frame)
             
-            # Process detections
-            detections = []
-            for result in results:
-                img_height, img_width = result.orig_img.shape[:2]
-                boxes = result.boxes
-                
-                for box in boxes:
-                    x = box.xywh[0][0].item()
-                    y = box.xywh[0][1].item()
-                    
-                    grid_x = int((x / img_width) * 5)
-                    grid_y = int((y / img_height) * 5)
-                    cls = int(box.cls[0].item())
-                    
-                    if 0 <= grid_x < 5 and 0 <= grid_y < 5:
-                        detections.append({
-                            'grid_x': grid_x,
-                            'grid_y': grid_y,
-                            'class': cls
-                        })
-            
-            # Update queues
-            if not self.frame_queue.full():
-                self.frame_queue.put(rgb_frame)
-            if not self.detection_queue.full():
-                self.detection_queue.put(detections)
+            # Run detection and change confirmation off the UI thread
+            with metrics.timer("process_frame"):
+                changes = self.tracker.process_frame(frame, frame_index)
+            for change in changes:
+                change['confirmed_at'] = time.perf_counter()
+                self.change_queue.put(change)
     
     def update_ui(self):
         try:
-            # Update video frame
-            if not self.frame_queue.empty():
-                frame = self.frame_queue.get_nowait()
-                image = Image.fromarray(frame)
-                display_size = (640, 480)
-                image = image.resize(display_size, Image.Resampling.LANCZOS)
-                photo = ImageTk.PhotoImage(image=image)
-                self.video_label.config(image=photo)
-                self.video_label.image = photo
-            
-            # Update grid with detections
-            if not self.detection_queue.empty():
-                detections = self.detection_queue.get_nowait()
-                
-                # Process each detection
-                for detection in detections:
-                    grid_key = f"{detection['grid_x']},{detection['grid_y']}"
-                    current_type = self.grid.get_cell_type(detection['grid_x'], detection['grid_y'])
-                    new_type = detection['class']
-                    
-                    # Skip if no change
-                    if current_type == new_type:
-                        if grid_key in self.change_tracking:
-                            del self.change_tracking[grid_key]
-                        continue
-                    
-                    # Initialize or update change tracking
-                    if grid_key not in self.change_tracking:
-                        self.change_tracking[grid_key] = {
-                            'new_type': new_type,
-                            'count': 1,
-                            'x': detection['grid_x'],
-                            'y': detection['grid_y']
-                        }
-                    else:
-                        track = self.change_tracking[grid_key]
-                        if track['new_type'] == new_type:
-                            track['count'] += 1
-                        else:
-                            # Reset if detected type changed
-                            track['new_type'] = new_type
-                            track['count'] = 1
-                
-                # Check for confirmed changes
-                confirmed_changes = []
-                keys_to_remove = []
-                
-                for grid_key, track in self.change_tracking.items():
-                    if track['count'] >= self.CHANGE_THRESHOLD:
-                        confirmed_changes.append(track)
-                        keys_to_remove.append(grid_key)
-                
-                # Apply confirmed changes
-                for change in confirmed_changes:
-                    self.grid.update_cell(
-                        change['x'],
-                        change['y'],
-                        change['new_type']
-                    )
-                
-                # Clean up confirmed changes
-                for key in keys_to_remove:
-                    del self.change_tracking[key]
-                
+            with metrics.timer("ui_update"):
+                self._update_ui()
         except Exception as e:
             print(f"Error updating UI: {e}")
         
         if self.is_running:
-            self.root.after(1, self.update_ui)
+            # Paced to the display rate so the main thread idles in between
+            self.root.after(1000 // self.DISPLAY_FPS, self.update_ui)
+    
+    def _update_ui(self):
+        # Update video frame
+        frame = self.display.take()
+        if frame is not None:
+            try:
+                with metrics.timer("ui_paste"):
+                    self.video_photo.paste(Image.fromarray(frame))
+            finally:
+                self.display.release()
+        
+        # Apply changes confirmed by the tracker
+        while not self.change_queue.empty():
+            change = self.change_queue.get_nowait()
+            metrics.observe("change_queue_wait", time.perf_counter() - change['confirmed_at'])
+            self.grid.update_cell(change['x'], change['y'], change['new_type'])
     
     def on_closing(self):
         self.is_running = False
-        if self.cap is not None:
+        if getattr(self, 'display', None) is not None:
+            self.display.close()
+        if getattr(self, 'reader', None) is not None:
+            self.reader.close()
+        elif self.cap is not None:
             self.cap.release()
+        registry.close()
         self.root.destroy()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CodeNames real-time board detector")
+    parser.add_argument("--backend", choices=BACKENDS, default="pytorch", help="Inference backend for the YOLO models")
+    parser.add_argument("--int8", action="store_true", help="Use INT8 quantized weights (onnx/openvino)")
+    parser.add_argument("--source", default="resources/game_video.mp4",
+                        help="Video file, camera index or stream URL")
+    parser.add_argument("--width", type=int, help="Capture width for live sources")
+    parser.add_argument("--height", type=int, help="Capture height for live sources")
+    parser.add_argument("--capture-fps", type=int, help="Capture frame rate for live sources")
+    parser.add_argument("--max-speed", action="store_true", help="Play video files as fast as they decode")
+    parser.add_argument("--inference-process", action="store_true",
+                        help="Run grid detection in a separate worker process")
+    parser.add_argument("--fast-ocr", action="store_true",
+                        help="Read only the word band of each card with the recognizer, skipping text detection")
+    parser.add_argument("--latency-target", type=float,
+                        help="Adapt the detection rate to confirm reveals within this many seconds")
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+    configure_profiling(args)
+    registry.configure(args.backend, args.int8, args.inference_process, args.fast_ocr)
+    
     root = tk.Tk()
-    app = CodeNamesApp(root)
+    capture_options = {'width': args.width, 'height': args.height, 'fps': args.capture_fps}
+    app = CodeNamesApp(root, args.source, capture_options, not args.max_speed, args.latency_target)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
\ No newline at end of file
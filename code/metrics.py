@@ -0,0 +1,211 @@
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class NullTimer:
+    # Shared do-nothing timer handed out while profiling is off
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_TIMER = NullTimer()
+
+class StageTimer:
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start_time)
+        return False
+
+class Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, percent):
+        # Upper bound of the bucket holding the percentile
+        if not self.count:
+            return None
+        target = self.count * percent / 100
+        cumulative = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS + (float('inf'),), self.bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+class Metrics:
+    """
+    Process-wide stage latency histograms and event counters. Everything is
+    a no-op until enable() is called, so instrumented code costs one
+    attribute check per stage when profiling is off.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.jsonl_path = None
+
+    def enable(self, jsonl_path=None, jsonl_interval=5.0):
+        self.enabled = True
+        self.jsonl_path = jsonl_path
+        if jsonl_path:
+            writer = threading.Thread(target=self._write_jsonl_periodically, args=(jsonl_interval,))
+            writer.daemon = True
+            writer.start()
+
+    def timer(self, stage):
+        """
+        Context manager recording how long the block took under stage.
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return StageTimer(self, stage)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, event, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[event] = self.counters.get(event, 0) + amount
+
+    def set_gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[name] = value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'time': time.time(),
+                'stages': {
+                    stage: {
+                        'count': histogram.count,
+                        'sum': histogram.total,
+                        'p50': histogram.percentile(50),
+                        'p95': histogram.percentile(95),
+                        'p99': histogram.percentile(99)
+                    }
+                    for stage, histogram in self.histograms.items()
+                },
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges)
+            }
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP codenames_stage_seconds Latency of each pipeline stage.",
+            "# TYPE codenames_stage_seconds histogram"
+        ]
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(LATENCY_BUCKETS, histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'codenames_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'codenames_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'codenames_stage_seconds_sum{{stage="{stage}"}} {histogram.total}')
+                lines.append(f'codenames_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            lines.append("# HELP codenames_events_total Pipeline event counters.")
+            lines.append("# TYPE codenames_events_total counter")
+            for event, count in sorted(self.counters.items()):
+                lines.append(f'codenames_events_total{{event="{event}"}} {count}')
+
+            lines.append("# HELP codenames_gauge Current pipeline settings and estimates.")
+            lines.append("# TYPE codenames_gauge gauge")
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f'codenames_gauge{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write_jsonl(self):
+        if self.jsonl_path:
+            with open(self.jsonl_path, 'a') as jsonl_file:
+                jsonl_file.write(json.dumps(self.snapshot()) + "\n")
+
+    def _write_jsonl_periodically(self, interval):
+        while self.enabled:
+            time.sleep(interval)
+            try:
+                self.write_jsonl()
+            except OSError as e:
+                print(f"Could not write metrics: {e}")
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serves /metrics in Prometheus text format and /metrics.json on a
+        background thread.
+        """
+        metrics = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+                elif self.path.startswith("/metrics"):
+                    body, content_type = metrics.to_prometheus().encode(), "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        http_server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        http_server.daemon_threads = True
+        server_thread = threading.Thread(target=http_server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        return http_server
+
+def add_profiling_arguments(parser):
+    parser.add_argument("--profile", action="store_true",
+                        help="Record per-stage latency metrics (also enabled by CODENAMES_PROFILE=1)")
+    parser.add_argument("--metrics-file", help="Append a JSON line of metrics every few seconds")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port")
+
+def configure_profiling(args):
+    if not (args.profile or args.metrics_file or args.metrics_port
+            or os.environ.get("CODENAMES_PROFILE") == "1"):
+        return
+    metrics.enable(args.metrics_file)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+
+metrics = Metrics()
@@ -0,0 +1,148 @@
+import threading
+import time
+import numpy as np
+from backends import resolve_model_path
+from ocr_handler import OCRHandler
+from yolo import GridDetector, KeyDetector
+from inference_worker import RemoteGridDetector
+
+GRID_MODEL_PATH = "models/grid_model.pt"
+KEY_MODEL_PATH = "models/key_model.pt"
+
+class ModelRegistry:
+    """
+    Process-wide cache of the YOLO detectors and the OCR reader. Each model is
+    loaded once, warmed up with a dummy inference and reused across games.
+    """
+    def __init__(self, backend="pytorch", int8=False):
+        self.backend = backend
+        self.int8 = int8
+        self.inference_process = False
+        self.fast_ocr = False
+        self.models = {}
+        self.load_times = {}
+        self.lock = threading.Lock()
+        self.model_locks = {}
+
+    def _get(self, key, create_model, warm_up):
+        with self.lock:
+            if key in self.models:
+                return self.models[key]
+            model_lock = self.model_locks.setdefault(key, threading.Lock())
+
+        # Only one thread loads a given model, the others wait for it
+        with model_lock:
+            if key in self.models:
+                return self.models[key]
+
+            start_time = time.perf_counter()
+            model = create_model()
+            loaded_time = time.perf_counter()
+            warm_up(model)
+            warmed_time = time.perf_counter()
+
+            with self.lock:
+                self.models[key] = model
+                self.load_times[key] = {
+                    'load': loaded_time - start_time,
+                    'warm_up': warmed_time - loaded_time
+                }
+            print(f"Loaded {key[0]} model {key[1]} in {loaded_time - start_time:.2f}s "
+                  f"(warm-up {warmed_time - loaded_time:.2f}s)")
+            return model
+
+    def configure(self, backend="pytorch", int8=False, inference_process=False, fast_ocr=False):
+        # Selects the inference backend for models loaded from now on,
+        # whether the grid detector runs in its own worker process and
+        # whether OCR uses the recognizer-only word band path
+        self.backend = backend
+        self.int8 = int8
+        self.inference_process = inference_process
+        self.fast_ocr = fast_ocr
+
+    def _model_key(self, kind, model_path):
+        return (kind, resolve_model_path(model_path, self.backend, self.int8))
+
+    def is_ready(self, *keys):
+        with self.lock:
+            return all(key in self.models for key in keys)
+
+    def _grid_kind(self):
+        return "remote_grid" if self.inference_process else "grid"
+
+    def _ocr_key(self):
+        # Each OCR mode is its own handler, warmed up on its own path
+        return ("ocr", "en-fast" if self.fast_ocr else "en")
+
+    def is_game_ready(self):
+        return self.is_ready(self._model_key(self._grid_kind(), GRID_MODEL_PATH), self._ocr_key())
+
+    def get_grid_detector(self, model_path=GRID_MODEL_PATH):
+        backend, int8 = self.backend, self.int8
+        detector_class = RemoteGridDetector if self.inference_process else GridDetector
+        return self._get(
+            self._model_key(self._grid_kind(), model_path),
+            lambda: detector_class(model_path, backend, int8),
+            lambda detector: detector.process_image(np.zeros((480, 640, 3), dtype=np.uint8))
+        )
+
+    def get_key_detector(self, model_path=KEY_MODEL_PATH):
+        backend, int8 = self.backend, self.int8
+        return self._get(
+            self._model_key("key", model_path),
+            lambda: KeyDetector(model_path, backend, int8),
+            lambda detector: detector.model(np.zeros((480, 640, 3), dtype=np.uint8), verbose=False)
+        )
+
+    def get_ocr(self):
+        fast_ocr = self.fast_ocr
+        return self._get(
+            self._ocr_key(),
+            lambda: OCRHandler(fast=fast_ocr),
+            self._warm_up_ocr
+        )
+
+    @staticmethod
+    def _warm_up_ocr(ocr):
+        # Run the same EasyOCR path the handler will use on live frames
+        if ocr.fast:
+            ocr._recognize_bands([np.zeros((48, 256, 3), dtype=np.uint8)])
+        else:
+            ocr.reader.readtext(np.zeros((64, 256, 3), dtype=np.uint8))
+
+    def preload(self, include_key_model=True, background=True):
+        """
+        Loads and warms up every model the game needs, on a background thread
+        by default so the UI stays responsive meanwhile.
+        """
+        def load_all():
+            try:
+                self.get_grid_detector()
+                self.get_ocr()
+                if include_key_model:
+                    self.get_key_detector()
+            except Exception as e:
+                print(f"Error preloading models: {e}")
+
+        if not background:
+            load_all()
+            return None
+
+        loading_thread = threading.Thread(target=load_all)
+        loading_thread.daemon = True
+        loading_thread.start()
+        return loading_thread
+
+    def close(self):
+        # Stops worker processes, in-process models need no cleanup
+        with self.lock:
+            models = list(self.models.values())
+        for model in models:
+            if hasattr(model, 'close'):
+                model.close()
+
+    def report(self):
+        with self.lock:
+            return {f"{kind}:{path}": dict(times) for (kind, path), times in self.load_times.items()}
+
+registry = ModelRegistry()
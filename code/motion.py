@@ -0,0 +1,80 @@
+import cv2
+import numpy as np
+
+class MotionGate:
+    """
+    Cheap change detector that decides whether a frame is worth running YOLO
+    on. Frames are downscaled to a small grayscale image, aligned to the
+    frame of the last inference by phase correlation so camera shake does
+    not count as change, and compared with it after a light blur, one mean
+    absolute difference per cell of the 5x5 board. The median cell difference is
+    subtracted, so what remains of a global change (blur, exposure, the
+    slight rotation alignment misses) does not mark every cell.
+    """
+    def __init__(self, cell_threshold=10.0, keep_alive=150, settle=3, size=(80, 60), blur=1.0):
+        # Mean gray-level difference (0-255) that marks a cell as changed
+        self.cell_threshold = cell_threshold
+        # Frames after which inference runs even on a static board
+        self.keep_alive = keep_alive
+        # Extra inferences after motion stops, so changes can be confirmed
+        self.settle = settle
+        # Downscaled size, must be divisible by 5 in both directions
+        self.size = size
+        # Blur applied before differencing, in downscaled pixels; absorbs the
+        # sub-pixel error left after alignment along card edges
+        self.blur = blur
+
+        self.reference = None
+        self.window = cv2.createHanningWindow(size, cv2.CV_32F)
+        self.last_inference = 0
+        self.settle_remaining = 0
+        self.cell_changes = np.zeros((5, 5), dtype=np.float32)
+
+    def _downscale(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.float32)
+
+    def _align(self, small):
+        # Shift the frame back onto the reference, sub-pixel. Some OpenCV
+        # builds apply the window to their inputs in place, hence the copies
+        (shift_x, shift_y), _ = cv2.phaseCorrelate(self.reference.copy(), small.copy(), self.window)
+        transform = np.float32([[1, 0, -shift_x], [0, 1, -shift_y]])
+        return cv2.warpAffine(small, transform, self.size, flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    def changed_cells(self):
+        """
+        Returns a 5x5 boolean array of the cells that changed in the last
+        frame checked, indexed [y][x].
+        """
+        return self.cell_changes > self.cell_threshold
+
+    def should_infer(self, frame, frame_index, force=False):
+        small = self._downscale(frame)
+
+        if self.reference is None:
+            motion = True
+        else:
+            width, height = self.size
+            difference = np.abs(
+                cv2.GaussianBlur(self._align(small), (0, 0), self.blur)
+                - cv2.GaussianBlur(self.reference, (0, 0), self.blur)
+            )
+            cell_changes = difference.reshape(5, height // 5, 5, width // 5).mean(axis=(1, 3))
+            self.cell_changes = cell_changes - np.median(cell_changes)
+            motion = bool((self.cell_changes > self.cell_threshold).any())
+
+        if motion:
+            self.settle_remaining = self.settle
+            triggered = True
+        elif self.settle_remaining > 0:
+            self.settle_remaining -= 1
+            triggered = True
+        else:
+            triggered = force or frame_index - self.last_inference >= self.keep_alive
+
+        if triggered:
+            self.reference = small
+            self.last_inference = frame_index
+        return triggered
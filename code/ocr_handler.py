@@ -1,37 +1,378 @@
+import base64
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import cv2
 import easyocr
+import numpy as np
+from metrics import metrics
+
+WORD_LIST_PATH = "resources/codenames_words.txt"
+
+# Where the word is printed on a card, as fractions of the card box
+WORD_BAND = (0.08, 0.55, 0.92, 0.92)
+WORD_CHARACTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ "
+
+# Height the word bands are scaled to before recognition, and the blank
+# rows between them in the stacked strip
+BAND_HEIGHT = 48
+BAND_GAP = 16
+
+# Size word bands are normalized to for the OCR cache, and the blur that
+# absorbs sub-pixel shifts of the crop
+FINGERPRINT_SIZE = (168, 48)
+FINGERPRINT_BLUR = 1.0
+# Coarse thumbnail size used to rank cache entries, how many of the best
+# are checked at full size, and the correlation and shift they must meet
+COARSE_SIZE = (42, 12)
+MATCH_CANDIDATES = 4
+MATCH_THRESHOLD = 0.99
+MATCH_SHIFT = 3
+
+def edit_distance(text, other_text):
+    previous_row = list(range(len(other_text) + 1))
+    for index, character in enumerate(text, 1):
+        current_row = [index]
+        for other_index, other_character in enumerate(other_text, 1):
+            current_row.append(min(
+                previous_row[other_index] + 1,
+                current_row[other_index - 1] + 1,
+                previous_row[other_index - 1] + (character != other_character)
+            ))
+        previous_row = current_row
+    return previous_row[-1]
+
+class WordIndex:
+    """
+    BK-tree over the card word list. Finds the closest word within a few
+    edits while comparing against only a small part of the list.
+    """
+    def __init__(self, words):
+        self.root = None
+        for word in words:
+            self._add(word)
+        self.lookups = {}
+
+    @classmethod
+    def load(cls, word_list_path):
+        try:
+            with open(word_list_path) as word_file:
+                return cls(line.strip().upper() for line in word_file if line.strip())
+        except OSError as e:
+            print(f"Could not load word list: {e}")
+            return None
+
+    def _add(self, word):
+        # Nodes are (word, {distance: child})
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            if distance not in node[1]:
+                node[1][distance] = (word, {})
+                return
+            node = node[1][distance]
+
+    def closest(self, text, max_distance=None):
+        """
+        Returns the word closest to text, or None when none is within
+        max_distance edits (a third of the text's length by default).
+        """
+        text = " ".join("".join(character for character in text.upper()
+                                if character.isalpha() or character == " ").split())
+        if not text or self.root is None:
+            return None
+        if max_distance is None:
+            max_distance = max(1, len(text) // 3)
+        if (text, max_distance) in self.lookups:
+            return self.lookups[(text, max_distance)]
+
+        best_word, best_distance = None, max_distance + 1
+        nodes = [self.root]
+        while nodes:
+            word, children = nodes.pop()
+            distance = edit_distance(text, word)
+            if distance < best_distance:
+                best_word, best_distance = word, distance
+            # Triangle inequality: only these subtrees can hold a closer word
+            for child_distance, child in children.items():
+                if abs(child_distance - distance) < best_distance:
+                    nodes.append(child)
+
+        self.lookups[(text, max_distance)] = best_word
+        return best_word
+
+def word_fingerprint(word_band):
+    """
+    Grayscale word band at a fixed size, blurred so that a sub-pixel shift
+    of the crop barely changes it. Used to recognize a card read before.
+    """
+    gray = cv2.cvtColor(word_band, cv2.COLOR_BGR2GRAY) if word_band.ndim == 3 else word_band
+    fingerprint = cv2.resize(gray, FINGERPRINT_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(fingerprint, (0, 0), FINGERPRINT_BLUR)
+
+def _coarse_vector(fingerprint):
+    # Zero-mean, unit-length thumbnail, so a dot product is a correlation
+    vector = cv2.resize(fingerprint, COARSE_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32).flatten()
+    vector -= vector.mean()
+    return vector / max(float(np.linalg.norm(vector)), 1e-6)
+
+def match_score(fingerprint, other_fingerprint):
+    """
+    Normalized correlation of two fingerprints at their best alignment,
+    within MATCH_SHIFT pixels.
+    """
+    center = other_fingerprint[MATCH_SHIFT:-MATCH_SHIFT, MATCH_SHIFT:-MATCH_SHIFT]
+    return float(cv2.matchTemplate(fingerprint, center, cv2.TM_CCOEFF_NORMED).max())
+
+class OCRCache:
+    """
+    Bounded LRU cache of OCR results keyed on the word band of the card,
+    optionally persisted to a JSON file. A lookup ranks the stored bands by
+    a coarse correlation, then accepts the best few candidates only if they
+    still match after aligning them to the pixel. Sensor noise and a shift
+    of a pixel or two still hit, words that differ in one letter do not.
+    """
+    def __init__(self, max_size=512, cache_path=None):
+        self.max_size = max_size
+        self.cache_path = cache_path
+        # Entry id -> (fingerprint, coarse vector, text)
+        self.entries = OrderedDict()
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.is_dirty = False
+
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path) as cache_file:
+                    for entry in json.load(cache_file):
+                        encoded = np.frombuffer(base64.b64decode(entry['fingerprint']), dtype=np.uint8)
+                        self.put(cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE), entry['text'])
+                self.is_dirty = False
+            except (OSError, ValueError, KeyError, TypeError, cv2.error) as e:
+                print(f"Could not load OCR cache: {e}")
+
+    def get(self, fingerprint):
+        with self.lock:
+            if not self.entries:
+                return None
+            entry_ids = list(self.entries)
+            scores = np.stack([entry[1] for entry in self.entries.values()]) @ _coarse_vector(fingerprint)
+
+            best_id, best_score = None, MATCH_THRESHOLD
+            for index in np.argsort(-scores)[:MATCH_CANDIDATES]:
+                score = match_score(self.entries[entry_ids[index]][0], fingerprint)
+                if score >= best_score:
+                    best_id, best_score = entry_ids[index], score
+            if best_id is None:
+                return None
+            self.entries.move_to_end(best_id)
+            return self.entries[best_id][2]
+
+    def put(self, fingerprint, text):
+        with self.lock:
+            self.entries[self.next_id] = (fingerprint, _coarse_vector(fingerprint), text)
+            self.next_id += 1
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            self.is_dirty = True
+
+    def save(self):
+        if not self.cache_path or not self.is_dirty:
+            return
+
+        with self.lock:
+            entries = [
+                {
+                    'fingerprint': base64.b64encode(cv2.imencode(".png", fingerprint)[1].tobytes()).decode("ascii"),
+                    'text': text
+                }
+                for fingerprint, _, text in self.entries.values()
+            ]
+            self.is_dirty = False
+        try:
+            with open(self.cache_path, 'w') as cache_file:
+                json.dump(entries, cache_file)
+        except OSError as e:
+            print(f"Could not save OCR cache: {e}")
 
 class OCRHandler:
-    def __init__(self):
+    def __init__(self, workers=4, cache_size=512, cache_path=None, fast=False, word_list_path=WORD_LIST_PATH):
         # Initialize OCR reader with English language
         self.reader = easyocr.Reader(['en'])
-    
-    def get_card_text(self, image, bbox):
-        """
-        Extracts text from a card within the specified bounding box.
-        Returns the most prominent text found or empty string if none detected.
-        """
+        self.workers = workers
+        self.cache = OCRCache(cache_size, cache_path)
+        # Recognizer-only reading of the word band instead of full readtext
+        self.fast = fast
+        # Readings are snapped to the closest word of the official list
+        self.word_index = WordIndex.load(word_list_path) if word_list_path else None
+
+    def _snap_to_word(self, text):
+        if not text or self.word_index is None:
+            return text
+        word = self.word_index.closest(text)
+        if word is None:
+            metrics.increment("ocr_unmatched")
+            return text
+        return word
+
+    def _crop_card(self, image, bbox):
+        # Ensure bbox coordinates are within image boundaries
+        x1, y1, x2, y2 = bbox
+        height, width = image.shape[:2]
+
+        safe_bbox = (
+            max(0, int(x1)),
+            max(0, int(y1)),
+            min(width, int(x2)),
+            min(height, int(y2))
+        )
+
+        return image[safe_bbox[1]:safe_bbox[3], safe_bbox[0]:safe_bbox[2]]
+
+    def _read_card_region(self, card_region):
         try:
-            # Ensure bbox coordinates are within image boundaries
-            x1, y1, x2, y2 = bbox
-            height, width = image.shape[:2]
-            
-            safe_bbox = (
-                max(0, int(x1)),
-                max(0, int(y1)),
-                min(width, int(x2)),
-                min(height, int(y2))
-            )
-            
-            # Extract the card region and perform OCR
-            card_region = image[safe_bbox[1]:safe_bbox[3], safe_bbox[0]:safe_bbox[2]]
-            detected_text = self.reader.readtext(card_region)
-            
+            if card_region.size == 0:
+                return ""
+
+            key = word_fingerprint(self._word_band_of(card_region))
+            cached_text = self.cache.get(key)
+            if cached_text is not None:
+                metrics.increment("ocr_cache_hits")
+                return cached_text
+
+            metrics.increment("ocr_cache_misses")
+            with metrics.timer("ocr"):
+                detected_text = self.reader.readtext(card_region)
+            text = ""
             if detected_text:
                 # Sort by vertical position and confidence, return highest confidence text
                 detected_text.sort(key=lambda x: (x[0][0][1], x[2]), reverse=True)
-                return detected_text[0][1]
-                
+                text = self._snap_to_word(detected_text[0][1])
+
+            self.cache.put(key, text)
+            return text
+
         except Exception as e:
             print(f"OCR Error: {e}")
-            
-        return ""
\ No newline at end of file
+
+        return ""
+
+    def get_card_text(self, image, bbox):
+        """
+        Extracts text from a card within the specified bounding box.
+        Returns the most prominent text found or empty string if none detected.
+        """
+        return self._read_card_region(self._crop_card(image, bbox))
+
+    def get_card_texts(self, image, bboxes):
+        """
+        Reads every card in one call, running the cache misses in a worker
+        pool. Returns the texts in the order of bboxes.
+        """
+        if self.fast:
+            texts = self._read_word_bands(image, bboxes)
+            self.cache.save()
+            return texts
+
+        card_regions = [self._crop_card(image, bbox) for bbox in bboxes]
+
+        if self.workers > 1 and len(card_regions) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                texts = list(executor.map(self._read_card_region, card_regions))
+        else:
+            texts = [self._read_card_region(card_region) for card_region in card_regions]
+
+        self.cache.save()
+        return texts
+
+    def _word_band_of(self, card_region):
+        height, width = card_region.shape[:2]
+        band_x1, band_y1, band_x2, band_y2 = WORD_BAND
+        band = card_region[int(height * band_y1):int(height * band_y2), int(width * band_x1):int(width * band_x2)]
+        # Cards too small to crop fall back to the whole region
+        return band if band.size else card_region
+
+    def _crop_word_band(self, image, bbox):
+        x1, y1, x2, y2 = bbox
+        band_x1, band_y1, band_x2, band_y2 = WORD_BAND
+        return self._crop_card(image, (
+            x1 + (x2 - x1) * band_x1,
+            y1 + (y2 - y1) * band_y1,
+            x1 + (x2 - x1) * band_x2,
+            y1 + (y2 - y1) * band_y2
+        ))
+
+    def _read_word_bands(self, image, bboxes):
+        """
+        Fast path of get_card_texts: reads only the word band of each card,
+        with every cache miss handed to the recognizer in a single call.
+        """
+        texts = [""] * len(bboxes)
+        misses = []
+        for index, bbox in enumerate(bboxes):
+            band = self._crop_word_band(image, bbox)
+            if band.size == 0:
+                continue
+            key = word_fingerprint(band)
+            cached_text = self.cache.get(key)
+            if cached_text is not None:
+                metrics.increment("ocr_cache_hits")
+                texts[index] = cached_text
+            else:
+                metrics.increment("ocr_cache_misses")
+                misses.append((index, key, band))
+
+        if misses:
+            try:
+                with metrics.timer("ocr"):
+                    recognized = self._recognize_bands([band for _, _, band in misses])
+                for (index, key, _), text in zip(misses, recognized):
+                    texts[index] = self._snap_to_word(text)
+                    self.cache.put(key, texts[index])
+            except Exception as e:
+                print(f"OCR Error: {e}")
+
+        return texts
+
+    def _recognize_bands(self, bands):
+        # Stack the bands into one grayscale strip, one known text box each,
+        # so EasyOCR skips its text detector. On CPU EasyOCR still recognizes
+        # the boxes one at a time (it finds that faster than padding them
+        # into a batch), on GPU it runs them as one batch
+        scaled_bands = []
+        for band in bands:
+            gray = cv2.cvtColor(band, cv2.COLOR_BGR2GRAY) if band.ndim == 3 else band
+            width = max(1, round(gray.shape[1] * BAND_HEIGHT / gray.shape[0]))
+            scaled_bands.append(cv2.resize(gray, (width, BAND_HEIGHT), interpolation=cv2.INTER_AREA))
+
+        row_height = BAND_HEIGHT + BAND_GAP
+        strip = np.full((len(bands) * row_height, max(band.shape[1] for band in scaled_bands)), 255, dtype=np.uint8)
+        text_boxes = []
+        for index, band in enumerate(scaled_bands):
+            top = index * row_height
+            strip[top:top + BAND_HEIGHT, :band.shape[1]] = band
+            text_boxes.append([0, band.shape[1], top, top + BAND_HEIGHT])
+
+        results = self.reader.recognize(
+            strip,
+            horizontal_list=text_boxes,
+            free_list=[],
+            batch_size=len(bands),
+            allowlist=WORD_CHARACTERS
+        )
+
+        # Results come back as (box points, text, confidence), matched to
+        # their band by the top edge of the box
+        texts = [""] * len(bands)
+        for box_points, text, _ in results:
+            index = int(round(box_points[0][1] / row_height))
+            if 0 <= index < len(bands):
+                texts[index] = text
+        return texts
@@ -0,0 +1,178 @@
+import cv2
+import numpy as np
+
+class BoardRegistration:
+    """
+    Estimates a homography from camera image to a canonical, head-on 5x5 board
+    using the centers of the detected cards. The homography is cached and only
+    re-estimated when the cards drift away from their cell centers.
+    """
+    def __init__(self, cell_size=(96, 64), min_cards=12, drift_threshold=0.25, refresh_interval=30):
+        self.cell_width, self.cell_height = cell_size
+        self.canonical_size = (5 * self.cell_width, 5 * self.cell_height)
+        # Cards needed for an estimate
+        self.min_cards = min_cards
+        # Mean distance from the cell centers, in cells, that counts as drift
+        self.drift_threshold = drift_threshold
+        # Warped inferences between full-frame checks of the homography
+        self.refresh_interval = refresh_interval
+
+        self.homography = None
+        self.inferences_since_check = 0
+        # Whether the last detect_batch ran on warped canonical images
+        self.last_batch_warped = False
+
+    def invalidate(self):
+        self.homography = None
+
+    def _cell_centers(self, grid_positions):
+        return np.column_stack((
+            (grid_positions[:, 0] + 0.5) * self.cell_width,
+            (grid_positions[:, 1] + 0.5) * self.cell_height
+        )).astype(np.float32)
+
+    def _to_cell_units(self, canonical_points):
+        return np.column_stack((
+            canonical_points[:, 0] / self.cell_width - 0.5,
+            canonical_points[:, 1] / self.cell_height - 0.5
+        ))
+
+    def _project(self, points, homography):
+        return cv2.perspectiveTransform(points.reshape(-1, 1, 2), homography).reshape(-1, 2)
+
+    @staticmethod
+    def _centers(detections):
+        return np.array([
+            [(d['bbox'][0] + d['bbox'][2]) / 2, (d['bbox'][1] + d['bbox'][3]) / 2]
+            for d in detections
+        ], dtype=np.float32).reshape(-1, 2)
+
+    def _alignment_error(self, canonical_points):
+        # Distance of each point from its nearest cell center, in cells
+        cell_units = self._to_cell_units(canonical_points)
+        offsets = cell_units - np.round(cell_units)
+        outside = ((cell_units < -0.5) | (cell_units > 4.5)).any(axis=1)
+        errors = np.hypot(offsets[:, 0], offsets[:, 1])
+        errors[outside] = 1.0
+        return errors
+
+    def estimate(self, detections):
+        """
+        Fits a new homography from one frame of detections. Returns True when
+        the fit is consistent with a 5x5 layout, leaving the cache untouched
+        otherwise.
+        """
+        centers = self._centers(detections)
+        if len(centers) < max(4, self.min_cards):
+            return False
+
+        # Outermost cards give a first guess at the four board corners
+        sums = centers[:, 0] + centers[:, 1]
+        differences = centers[:, 0] - centers[:, 1]
+        corners = centers[[np.argmin(sums), np.argmax(differences), np.argmax(sums), np.argmin(differences)]]
+        corner_cells = self._cell_centers(np.array([[0, 0], [4, 0], [4, 4], [0, 4]]))
+        if len(np.unique(corners, axis=0)) < 4:
+            return False
+        initial = cv2.getPerspectiveTransform(corners, corner_cells)
+
+        # Snap every card to its nearest cell and refine on all of them
+        grid_positions = np.clip(np.round(self._to_cell_units(self._project(centers, initial))), 0, 4)
+        refined, _ = cv2.findHomography(
+            centers,
+            self._cell_centers(grid_positions),
+            cv2.RANSAC,
+            0.3 * min(self.cell_width, self.cell_height)
+        )
+        if refined is None:
+            return False
+
+        canonical_points = self._project(centers, refined)
+        assigned_cells = np.round(self._to_cell_units(canonical_points))
+        if len(np.unique(assigned_cells, axis=0)) < len(centers) * 0.9:
+            return False
+        if self._alignment_error(canonical_points).mean() > self.drift_threshold:
+            return False
+
+        self.homography = refined
+        self.inferences_since_check = 0
+        return True
+
+    def drift(self, detections):
+        """
+        Mean distance in cells between the full-frame detections and their
+        cell centers under the cached homography.
+        """
+        centers = self._centers(detections)
+        if self.homography is None or len(centers) == 0:
+            return float('inf')
+        return float(self._alignment_error(self._project(centers, self.homography)).mean())
+
+    def canonical_drift(self, detections):
+        # Same as drift, for detections made on the warped board image
+        centers = self._centers(detections)
+        if len(centers) == 0:
+            return float('inf')
+        return float(self._alignment_error(centers).mean())
+
+    def update(self, detections):
+        """
+        Re-estimates the homography only when there is none yet or the cards
+        drifted. Returns True when a usable homography is cached.
+        """
+        if self.homography is None or self.drift(detections) > self.drift_threshold:
+            if not self.estimate(detections) and self.homography is not None:
+                # The old homography no longer fits, fall back until it does
+                self.invalidate()
+        return self.homography is not None
+
+    def map_detections(self, detections):
+        """
+        Replaces the proportional grid position of full-frame detections with
+        the exact cell under the homography, dropping cards off the board.
+        """
+        centers = self._centers(detections)
+        if self.homography is None or len(centers) == 0:
+            return detections
+
+        cell_units = self._to_cell_units(self._project(centers, self.homography))
+        grid_positions = np.round(cell_units).astype(int)
+        mapped_detections = []
+        for detection, (grid_x, grid_y) in zip(detections, grid_positions.tolist()):
+            if 0 <= grid_x < 5 and 0 <= grid_y < 5:
+                mapped_detections.append(dict(detection, grid_x=grid_x, grid_y=grid_y))
+        return mapped_detections
+
+    def warp(self, frame):
+        """
+        Warps a camera frame into the small canonical board image, where
+        every card sits in its own fixed cell.
+        """
+        return cv2.warpPerspective(frame, self.homography, self.canonical_size, flags=cv2.INTER_LINEAR)
+
+    def detect_batch(self, detector, frames):
+        """
+        Runs the detector over frames, on the warped board once a homography
+        is cached and on the full frame while estimating or re-checking it.
+        """
+        self.last_batch_warped = (self.homography is not None
+                                  and self.inferences_since_check < self.refresh_interval)
+        if self.last_batch_warped:
+            self.inferences_since_check += len(frames)
+            warped_frames = [self.warp(frame) for frame in frames]
+            results = detector.process_batch(warped_frames, imgsz=max(self.canonical_size))
+
+            # Cards sliding off their canonical cells mean the board moved,
+            # drop those detections rather than vote into the wrong cells
+            for index, detections in enumerate(results):
+                if (len(detections) < self.min_cards // 2
+                        or self.canonical_drift(detections) > self.drift_threshold):
+                    self.invalidate()
+                    results[index] = []
+            return results
+
+        results = detector.process_batch(frames)
+        for index, detections in enumerate(results):
+            self.inferences_since_check = 0
+            if self.update(detections):
+                results[index] = self.map_detections(detections)
+        return results
@@ -0,0 +1,123 @@
+import math
+from yolo import boxes_to_detections
+from metrics import metrics
+
+class BoardROI:
+    """
+    Adaptive region of interest: once the board has been found on a full
+    frame, detection runs on a crop around it at an input size proportional
+    to the crop, so cards keep the same resolution while the model sees far
+    fewer pixels. Boxes are mapped back to frame coordinates, so the grid
+    mapping is the same as on the full frame.
+    """
+    def __init__(self, margin=0.15, min_cards=12, confidence_ratio=0.8,
+                 refresh_interval=60, full_imgsz=640, min_imgsz=160):
+        # Margin around the board bounding box, as a fraction of its size
+        self.margin = margin
+        # Cards needed on a full frame to lock onto the board
+        self.min_cards = min_cards
+        # Fall back to the full frame when the mean confidence in the crop
+        # drops below this fraction of the confidence at lock time
+        self.confidence_ratio = confidence_ratio
+        # Inferences between full-frame checks, even when nothing looks wrong
+        self.refresh_interval = refresh_interval
+        # Model input size for full frames; crops scale it down
+        self.full_imgsz = full_imgsz
+        self.min_imgsz = min_imgsz
+
+        self.crop = None
+        self.reference_confidence = 0.0
+        self.reference_cards = 0
+        self.inferences_since_check = 0
+
+    def invalidate(self):
+        self.crop = None
+
+    def _board_bbox(self, boxes):
+        # Union of the card boxes, from (n, 6) center/size rows
+        half_sizes = boxes[:, 2:4] / 2
+        top_left = (boxes[:, 0:2] - half_sizes).min(axis=0)
+        bottom_right = (boxes[:, 0:2] + half_sizes).max(axis=0)
+        return top_left[0], top_left[1], bottom_right[0], bottom_right[1]
+
+    def _crop_for(self, boxes, frame_shape):
+        frame_height, frame_width = frame_shape[:2]
+        x1, y1, x2, y2 = self._board_bbox(boxes)
+        margin_x = (x2 - x1) * self.margin
+        margin_y = (y2 - y1) * self.margin
+        return (
+            max(0, int(x1 - margin_x)),
+            max(0, int(y1 - margin_y)),
+            min(frame_width, int(math.ceil(x2 + margin_x))),
+            min(frame_height, int(math.ceil(y2 + margin_y)))
+        )
+
+    def _imgsz_for(self, crop, frame_shape):
+        # Keep the pixels per card of a full-frame pass, in steps of 32
+        frame_height, frame_width = frame_shape[:2]
+        x1, y1, x2, y2 = crop
+        scale = max((x2 - x1) / frame_width, (y2 - y1) / frame_height)
+        imgsz = int(math.ceil(self.full_imgsz * scale / 32)) * 32
+        return max(self.min_imgsz, min(self.full_imgsz, imgsz))
+
+    def _lock(self, boxes, frame_shape):
+        if len(boxes) < self.min_cards:
+            self.invalidate()
+            return
+        self.crop = self._crop_for(boxes, frame_shape)
+        self.reference_confidence = float(boxes[:, 4].mean())
+        self.reference_cards = len(boxes)
+        self.inferences_since_check = 0
+
+    def _board_moved(self, boxes, frame_shape):
+        # Cards cut off by the crop edge or far fewer cards than at lock time
+        if len(boxes) < self.reference_cards // 2:
+            return True
+        if float(boxes[:, 4].mean()) < self.reference_confidence * self.confidence_ratio:
+            return True
+
+        # Crop edges on the frame border cannot cut anything off
+        frame_height, frame_width = frame_shape[:2]
+        x1, y1, x2, y2 = self.crop
+        board_x1, board_y1, board_x2, board_y2 = self._board_bbox(boxes)
+        edge = 2
+        return (x1 > 0 and board_x1 <= x1 + edge
+                or y1 > 0 and board_y1 <= y1 + edge
+                or x2 < frame_width and board_x2 >= x2 - edge
+                or y2 < frame_height and board_y2 >= y2 - edge)
+
+    def detect_batch(self, detector, frames, imgsz=None):
+        """
+        Runs the detector over frames, on the board crop while locked and on
+        the full frame while searching or re-checking. Returns detections in
+        frame coordinates. imgsz overrides the full-frame input size, and the
+        crop sizes are scaled down from it.
+        """
+        if imgsz is not None:
+            self.full_imgsz = imgsz
+        frame_shape = frames[0].shape
+        if self.crop is not None and self.inferences_since_check < self.refresh_interval:
+            self.inferences_since_check += len(frames)
+            x1, y1, x2, y2 = self.crop
+            crops = [frame[y1:y2, x1:x2] for frame in frames]
+            all_boxes = detector.predict(crops, imgsz=self._imgsz_for(self.crop, frame_shape))
+            metrics.increment("roi_inferences", len(frames))
+
+            results = []
+            for boxes in all_boxes:
+                boxes[:, 0] += x1
+                boxes[:, 1] += y1
+                results.append(boxes_to_detections(boxes, frame_shape))
+                if self.crop is not None and self._board_moved(boxes, frame_shape):
+                    # The cards seen are still valid, search the full frame next time
+                    metrics.increment("roi_fallbacks")
+                    self.invalidate()
+                elif self.crop is not None and len(boxes) >= self.min_cards:
+                    # Follow slow camera drift
+                    self.crop = self._crop_for(boxes, frame_shape)
+            return results
+
+        all_boxes = detector.predict(frames, imgsz=imgsz)
+        for boxes in all_boxes:
+            self._lock(boxes, frame_shape)
+        return [boxes_to_detections(boxes, frame.shape) for frame, boxes in zip(frames, all_boxes)]
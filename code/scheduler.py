@@ -0,0 +1,119 @@
+import math
+from metrics import metrics
+
+class FrameScheduler:
+    """
+    Picks the sampling interval, and optionally the model input size, from
+    measured detector latency and decoder cost so that reveals reach the
+    display within a latency target. The smallest interval the host can
+    sustain in real time is used; resolution only drops when even that
+    misses the target, and comes back once there is room again.
+    """
+    def __init__(self, latency_target=1.0, source_fps=30.0, change_threshold=3, min_skip=0,
+                 max_skip=60, imgsz_steps=None, headroom=1.2, smoothing=0.2, cooldown=5):
+        self.latency_target = latency_target
+        self.source_fps = source_fps
+        self.change_threshold = change_threshold
+        self.min_skip = min_skip
+        self.max_skip = max_skip
+        # Model input sizes to choose from, largest first; None keeps the
+        # detector's own size
+        self.imgsz_steps = tuple(imgsz_steps) if imgsz_steps else None
+        self.imgsz_index = 0
+        # Margin kept between the sampled frame rate and what the detector
+        # sustains, and the weight of new measurements
+        self.headroom = headroom
+        self.smoothing = smoothing
+        # Inferences between resolution changes, so the latency estimate
+        # settles on the new size first
+        self.cooldown = cooldown
+        self.inferences_since_resize = 0
+
+        self.inference_seconds = None
+        self.reader = None
+        self.frames_to_skip = min_skip
+        self.predicted_latency = None
+
+    @property
+    def imgsz(self):
+        return self.imgsz_steps[self.imgsz_index] if self.imgsz_steps else None
+
+    def watch(self, reader):
+        # PrefetchReader whose grab and decode times count against the budget
+        self.reader = reader
+
+    def _smooth(self, average, value):
+        if average is None:
+            return value
+        return average + self.smoothing * (value - average)
+
+    def observe_inference(self, seconds):
+        """
+        Records how long one detection call took and updates the decisions.
+        """
+        self.inference_seconds = self._smooth(self.inference_seconds, seconds)
+        self.inferences_since_resize += 1
+        self.update()
+
+    def _frame_costs(self):
+        if self.reader is None:
+            return 0.0, 0.0
+        return self.reader.grab_seconds or 0.0, self.reader.decode_seconds or 0.0
+
+    def _skip_for(self, inference_seconds, grab_seconds, decode_seconds):
+        # Each sampled interval of skip + 1 frames must fit its own video time:
+        # (skip + 1) * (1 / fps - grab) >= inference + decode
+        spare_per_frame = 1.0 / self.source_fps - grab_seconds
+        if spare_per_frame <= 0:
+            return self.max_skip
+        stride = (inference_seconds + decode_seconds) * self.headroom / spare_per_frame
+        return max(self.min_skip, min(self.max_skip, math.ceil(stride) - 1))
+
+    def _latency_for(self, frames_to_skip, inference_seconds):
+        # A change needs change_threshold sampled frames to be confirmed
+        interval = max((frames_to_skip + 1) / self.source_fps, inference_seconds)
+        return self.change_threshold * interval + inference_seconds
+
+    def update(self):
+        if self.inference_seconds is None:
+            return
+
+        grab_seconds, decode_seconds = self._frame_costs()
+        self.frames_to_skip = self._skip_for(self.inference_seconds, grab_seconds, decode_seconds)
+        self.predicted_latency = self._latency_for(self.frames_to_skip, self.inference_seconds)
+
+        if self.imgsz_steps and self.inferences_since_resize >= self.cooldown:
+            # Latency scales roughly with the input area
+            if self.predicted_latency > self.latency_target and self.imgsz_index < len(self.imgsz_steps) - 1:
+                self._resize(self.imgsz_index + 1)
+            elif self.imgsz_index > 0:
+                scale = (self.imgsz_steps[self.imgsz_index - 1] / self.imgsz) ** 2
+                larger_seconds = self.inference_seconds * scale
+                larger_skip = self._skip_for(larger_seconds, grab_seconds, decode_seconds)
+                if self._latency_for(larger_skip, larger_seconds) < self.latency_target * 0.8:
+                    self._resize(self.imgsz_index - 1)
+
+        metrics.set_gauge("scheduler_frames_to_skip", self.frames_to_skip)
+        metrics.set_gauge("scheduler_predicted_latency_seconds", self.predicted_latency)
+        if self.imgsz is not None:
+            metrics.set_gauge("scheduler_imgsz", self.imgsz)
+
+    def _resize(self, imgsz_index):
+        self.inference_seconds *= (self.imgsz_steps[imgsz_index] / self.imgsz) ** 2
+        self.imgsz_index = imgsz_index
+        self.inferences_since_resize = 0
+
+    def decisions(self):
+        """
+        Current choices and the measurements behind them.
+        """
+        grab_seconds, decode_seconds = self._frame_costs()
+        return {
+            'frames_to_skip': self.frames_to_skip,
+            'imgsz': self.imgsz,
+            'predicted_latency': self.predicted_latency,
+            'latency_target': self.latency_target,
+            'inference_seconds': self.inference_seconds,
+            'grab_seconds': grab_seconds,
+            'decode_seconds': decode_seconds
+        }
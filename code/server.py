@@ -0,0 +1,460 @@
+import argparse
+import base64
+import hashlib
+import json
+import select
+import struct
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from board_tracker import BoardTracker
+from frame_source import open_source, parse_source
+from metrics import metrics, add_profiling_arguments, configure_profiling
+from model_registry import registry
+from motion import MotionGate
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+# How often a WebSocket stream checks for client frames while idle
+WEBSOCKET_POLL_SECONDS = 1.0
+
+class TableSession:
+    """
+    One table being served: its stream, board state and change tracking.
+    The capture thread decodes frames and parks the newest sampled one for
+    the shared inference pool.
+    """
+    def __init__(self, table_id, source, pool, ocr, ocr_lock, change_threshold=3, frames_to_skip=5):
+        self.table_id = table_id
+        self.source = source
+        self.pool = pool
+        self.ocr_lock = ocr_lock
+
+        self.tracker = BoardTracker(
+            pool.detector,
+            ocr,
+            change_threshold=change_threshold,
+            frames_to_skip=frames_to_skip,
+            motion_gate=MotionGate()
+        )
+        self.lock = threading.Lock()
+        self.events_changed = threading.Condition(self.lock)
+        self.events = []
+        self.pending_frame = None
+        self.inferences = 0
+        self.stale_frames = 0
+        self.is_running = False
+        self.capture_thread = None
+
+    def start(self):
+        self.is_running = True
+        self.capture_thread = threading.Thread(target=self._capture)
+        self.capture_thread.daemon = True
+        self.capture_thread.start()
+
+    def stop(self):
+        self.is_running = False
+
+    def _add_event(self, event):
+        # Called with self.lock held
+        event['seq'] = len(self.events) + 1
+        event['time'] = time.time()
+        self.events.append(event)
+        self.events_changed.notify_all()
+
+    def _capture(self):
+        # Files are paced to real time, live sources only yield their newest frame
+        cap = open_source(self.source)
+
+        ret, frame = cap.read()
+        if not ret:
+            print(f"Error: Could not read initial frame of table {self.table_id}")
+            self.is_running = False
+            cap.release()
+            return
+
+        # The detector and OCR reader are shared with the other tables
+        with self.pool.model_lock:
+            detections = self.pool.detector.process_image(frame)
+        with self.ocr_lock:
+            cells = self.tracker.initialize(frame, detections)
+        with self.lock:
+            for cell in cells:
+                self._add_event({'kind': 'card', 'x': cell['x'], 'y': cell['y'], 'text': cell['text']})
+
+        while self.is_running:
+            ret, frame = cap.read()
+            if not ret:
+                break
+
+            with self.lock:
+                frame_index = self.tracker.sample_frame(frame)
+                if frame_index is not None:
+                    # Latest-frame semantics: a newer sample replaces a stale one
+                    if self.pending_frame is not None:
+                        self.stale_frames += 1
+                        metrics.increment("stale_frames_dropped")
+                    self.pending_frame = (frame_index, frame)
+            if frame_index is not None:
+                self.pool.notify(self)
+
+        self.is_running = False
+        cap.release()
+
+    def take_pending_frame(self):
+        with self.lock:
+            pending_frame, self.pending_frame = self.pending_frame, None
+            return pending_frame
+
+    def apply_detections(self, detections, frame_index):
+        with self.lock:
+            self.inferences += 1
+            for change in self.tracker.apply_detections(detections, frame_index):
+                self._add_event(dict(change, kind='change'))
+
+    def wait_for_events(self, since, timeout):
+        with self.lock:
+            if len(self.events) <= since and self.is_running:
+                self.events_changed.wait(timeout)
+            return self.events[since:]
+
+    def state(self):
+        with self.lock:
+            return {
+                'id': self.table_id,
+                'source': str(self.source),
+                'running': self.is_running,
+                'frames': self.tracker.frame_count,
+                'inferences': self.inferences,
+                'stale_frames': self.stale_frames,
+                'seq': len(self.events),
+                'types': self.tracker.cell_types.tolist(),
+                'texts': [list(row) for row in self.tracker.cell_texts]
+            }
+
+class InferencePool:
+    """
+    Worker threads sharing one detector across all tables. Tables with a
+    pending frame wait in a FIFO and each table contributes at most one frame
+    per batch, so a busy stream cannot starve the others.
+    """
+    def __init__(self, detector, workers=2, batch_size=4):
+        self.detector = detector
+        self.batch_size = max(1, batch_size)
+        self.ready_tables = deque()
+        self.condition = threading.Condition()
+        # The model itself runs one batch at a time, pre/post-processing overlaps
+        self.model_lock = threading.Lock()
+        self.is_running = True
+
+        self.workers = []
+        for _ in range(workers):
+            worker = threading.Thread(target=self._run)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def notify(self, table):
+        with self.condition:
+            if table not in self.ready_tables:
+                self.ready_tables.append(table)
+                self.condition.notify()
+
+    def close(self):
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+
+    def _next_batch(self):
+        with self.condition:
+            while self.is_running and not self.ready_tables:
+                self.condition.wait()
+            tables = []
+            while self.ready_tables and len(tables) < self.batch_size:
+                tables.append(self.ready_tables.popleft())
+            return tables
+
+    def _run(self):
+        while self.is_running:
+            batch = []
+            for table in self._next_batch():
+                pending_frame = table.take_pending_frame()
+                if pending_frame is not None:
+                    batch.append((table, pending_frame))
+            if not batch:
+                continue
+            metrics.increment("pool_batches")
+
+            try:
+                with self.model_lock:
+                    results = self.detector.process_batch([frame for _, (_, frame) in batch])
+            except Exception as e:
+                print(f"Inference error: {e}")
+                continue
+
+            for (table, (frame_index, _)), detections in zip(batch, results):
+                table.apply_detections(detections, frame_index)
+
+class TableServer:
+    def __init__(self, workers=2, batch_size=4, change_threshold=3, frames_to_skip=5):
+        self.pool = InferencePool(registry.get_grid_detector(), workers, batch_size)
+        self.ocr = registry.get_ocr()
+        self.ocr_lock = threading.Lock()
+        self.change_threshold = change_threshold
+        self.frames_to_skip = frames_to_skip
+        self.tables = {}
+        self.lock = threading.Lock()
+
+    def add_table(self, table_id, source):
+        with self.lock:
+            if table_id in self.tables:
+                raise ValueError(f"Table '{table_id}' already exists")
+            table = TableSession(
+                table_id, source, self.pool, self.ocr, self.ocr_lock,
+                self.change_threshold, self.frames_to_skip
+            )
+            self.tables[table_id] = table
+        table.start()
+        return table
+
+    def remove_table(self, table_id):
+        with self.lock:
+            table = self.tables.pop(table_id, None)
+        if table is not None:
+            table.stop()
+        return table is not None
+
+    def get_table(self, table_id):
+        with self.lock:
+            return self.tables.get(table_id)
+
+    def list_tables(self):
+        with self.lock:
+            tables = list(self.tables.values())
+        return [table.state() for table in tables]
+
+class TableRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET    /tables                         list tables
+    POST   /tables                         add a table: {"id": ..., "source": ...}
+    GET    /tables/<id>                    current board state
+    DELETE /tables/<id>                    stop a table
+    GET    /tables/<id>/events?since=N     long-poll events after sequence N
+    GET    /tables/<id>/ws?since=N         WebSocket pushing each event as JSON
+    GET    /metrics                        Prometheus metrics when profiling
+    """
+    server_version = "CodenamesTableServer/1.0"
+    # WebSocket upgrades require HTTP/1.1, every response sets Content-Length
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        return parts, parse_qs(url.query)
+
+    def do_GET(self):
+        parts, query = self._route()
+        tables = self.server.tables
+
+        if parts == ["tables"]:
+            self._send_json(tables.list_tables())
+            return
+        if parts == ["metrics"]:
+            body = metrics.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if len(parts) < 2 or parts[0] != "tables":
+            self._send_json({'error': 'not found'}, 404)
+            return
+
+        table = tables.get_table(parts[1])
+        if table is None:
+            self._send_json({'error': f"unknown table '{parts[1]}'"}, 404)
+            return
+
+        try:
+            since = int(query.get("since", ["0"])[0])
+            timeout = float(query.get("timeout", ["30"])[0])
+        except ValueError as e:
+            self._send_json({'error': str(e)}, 400)
+            return
+        if since < 0:
+            self._send_json({'error': 'since must not be negative'}, 400)
+            return
+        if len(parts) == 2:
+            self._send_json(table.state())
+        elif parts[2:] == ["events"]:
+            self._send_json(table.wait_for_events(since, timeout))
+        elif parts[2:] == ["ws"]:
+            self._stream_websocket(table, since)
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        parts, _ = self._route()
+        # Always consume the body, the connection is kept alive
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        except ValueError as e:
+            self.close_connection = True
+            self._send_json({'error': str(e)}, 400)
+            return
+        if parts != ["tables"]:
+            self._send_json({'error': 'not found'}, 404)
+            return
+
+        try:
+            request = json.loads(body or b"{}")
+            table = self.server.tables.add_table(str(request['id']), parse_source(str(request['source'])))
+        except (KeyError, ValueError) as e:
+            self._send_json({'error': str(e)}, 400)
+            return
+        self._send_json(table.state(), 201)
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        if len(parts) == 2 and parts[0] == "tables" and self.server.tables.remove_table(parts[1]):
+            self._send_json({'removed': parts[1]})
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def _stream_websocket(self, table, since):
+        key = self.headers.get("Sec-WebSocket-Key")
+        if not key or self.headers.get("Upgrade", "").lower() != "websocket":
+            self._send_json({'error': 'expected a WebSocket upgrade'}, 400)
+            return
+
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+
+        # One text frame per event. Between waits, answer the client's
+        # Ping and Close frames and notice when it has gone away
+        try:
+            while self._read_client_frames():
+                events = table.wait_for_events(since, WEBSOCKET_POLL_SECONDS)
+                for event in events:
+                    self._send_websocket_frame(0x1, json.dumps(event).encode())
+                since += len(events)
+                if not events and not table.is_running:
+                    self._send_websocket_frame(0x8, struct.pack("!H", 1000))
+                    break
+        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+            pass
+        self.close_connection = True
+
+    def _read_client_frames(self):
+        """
+        Handles every client frame waiting on the socket without blocking.
+        Returns False once the client has closed the connection.
+        """
+        while select.select([self.connection], [], [], 0)[0]:
+            frame = self._read_websocket_frame()
+            if frame is None:
+                return False
+            opcode, payload = frame
+            if opcode == 0x8:
+                # Echo the status code back, as the closing handshake requires
+                self._send_websocket_frame(0x8, payload[:2])
+                return False
+            if opcode == 0x9:
+                self._send_websocket_frame(0xA, payload)
+        return True
+
+    def _read_websocket_frame(self):
+        # Read from the socket itself, so select sees any frame left unread
+        header = self._receive_exactly(2)
+        if header is None:
+            return None
+        opcode, length = header[0] & 0x0F, header[1] & 0x7F
+        if length == 126:
+            extended = self._receive_exactly(2)
+            length = struct.unpack("!H", extended)[0] if extended else None
+        elif length == 127:
+            extended = self._receive_exactly(8)
+            length = struct.unpack("!Q", extended)[0] if extended else None
+        if length is None:
+            return None
+        mask = self._receive_exactly(4) if header[1] & 0x80 else b"\0\0\0\0"
+        payload = self._receive_exactly(length) if mask is not None else None
+        if payload is None:
+            return None
+        return opcode, bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+
+    def _receive_exactly(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.connection.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def _send_websocket_frame(self, opcode, payload):
+        if len(payload) < 126:
+            header = struct.pack("!BB", 0x80 | opcode, len(payload))
+        elif len(payload) < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, len(payload))
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, len(payload))
+        self.wfile.write(header + payload)
+        self.wfile.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve many tables from one shared inference pool")
+    parser.add_argument("--source", action="append", default=[], metavar="ID=SOURCE",
+                        help="Table to start with, e.g. table1=rtsp://camera/stream or table2=0")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2, help="Inference worker threads")
+    parser.add_argument("--batch-size", type=int, default=4, help="Max tables per model call")
+    parser.add_argument("--threshold", type=int, default=3)
+    parser.add_argument("--skip", type=int, default=5)
+    parser.add_argument("--inference-process", action="store_true",
+                        help="Run grid detection in a separate worker process")
+    parser.add_argument("--fast-ocr", action="store_true",
+                        help="Read only the word band of each card with the recognizer, skipping text detection")
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+    configure_profiling(args)
+    registry.configure(inference_process=args.inference_process, fast_ocr=args.fast_ocr)
+
+    tables = TableServer(args.workers, args.batch_size, args.threshold, args.skip)
+    for table_source in args.source:
+        table_id, _, source = table_source.partition("=")
+        tables.add_table(table_id, parse_source(source))
+
+    http_server = ThreadingHTTPServer((args.host, args.port), TableRequestHandler)
+    http_server.daemon_threads = True
+    http_server.tables = tables
+    print(f"Serving {len(args.source)} tables on http://{args.host}:{args.port}")
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tables.pool.close()
+        registry.close()
+        http_server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,79 @@
 import tkinter as tk
+import numpy as np
 from PIL import Image, ImageTk
+from metrics import metrics
+
+class BoardCanvas:
+    """
+    Draws a 5x5 board on a single Canvas. set_cell only records how a cell
+    should look; all cells set during one Tk event are drawn together in one
+    idle callback, and only canvas items whose look changed are touched.
+    """
+    def __init__(self, parent, cell_width, cell_height, spacing, font):
+        self.canvas = tk.Canvas(
+            parent,
+            width=5 * cell_width + 6 * spacing,
+            height=5 * cell_height + 6 * spacing,
+            highlightthickness=0
+        )
+        
+        self.items = []
+        for row in range(5):
+            item_row = []
+            for col in range(5):
+                left = spacing + col * (cell_width + spacing)
+                top = spacing + row * (cell_height + spacing)
+                rect = self.canvas.create_rectangle(
+                    left, top, left + cell_width, top + cell_height,
+                    fill='white', outline='black', width=1
+                )
+                image = self.canvas.create_image(left, top, anchor='nw', state='hidden')
+                text = self.canvas.create_text(
+                    left + cell_width / 2, top + cell_height / 2,
+                    text="", width=cell_width - 20, justify='center', font=font
+                )
+                item_row.append((rect, image, text))
+            self.items.append(item_row)
+        
+        # Look on screen and looks waiting for the next redraw
+        self.shown = [[None for _ in range(5)] for _ in range(5)]
+        self.desired = {}
+        self.redraw_pending = False
+
+    def set_cell(self, x, y, fill, image=None, text="", text_color='black'):
+        look = (fill, image, text, text_color)
+        if (x, y) not in self.desired and look == self.shown[y][x]:
+            return
+        
+        self.desired[(x, y)] = look
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            self.canvas.after_idle(self._redraw)
+
+    def _redraw(self):
+        with metrics.timer("grid_redraw"):
+            self._apply_desired_looks()
+        self.desired.clear()
+        self.redraw_pending = False
+    
+    def _apply_desired_looks(self):
+        for (x, y), look in self.desired.items():
+            shown = self.shown[y][x]
+            if look == shown:
+                continue
+            
+            rect, image, text = self.items[y][x]
+            fill, photo, label, text_color = look
+            if shown is None or shown[0] != fill:
+                self.canvas.itemconfigure(rect, fill=fill)
+            if shown is None or shown[1] is not photo:
+                if photo is None:
+                    self.canvas.itemconfigure(image, image='', state='hidden')
+                else:
+                    self.canvas.itemconfigure(image, image=photo, state='normal')
+            if shown is None or shown[2:] != (label, text_color):
+                self.canvas.itemconfigure(text, text=label, fill=text_color)
+            self.shown[y][x] = look
 
 class GameGrid:
     def __init__(self, root):
@@ -18,9 +92,10 @@ class GameGrid:
             4: {"type": "image", "value": self.card_images["assassin"]} # Assassin
         }
         
-        self.cells = []
-        self.cell_states = {}
-        self._initialize_grid(cell_width, cell_height)
+        self.cell_types = np.zeros((5, 5), dtype=np.int8)
+        self.cell_texts = [["" for _ in range(5)] for _ in range(5)]
+        self.board = BoardCanvas(self.frame, cell_width, cell_height, 2, ('Arial', 12, 'bold'))
+        self.board.canvas.pack()
 
     def _load_card_images(self, width, height):
         images = {
@@ -29,77 +104,23 @@ class GameGrid:
             "assassin": Image.open("resources/assassin.png"),
             "neutral": Image.open("resources/innocent_bystander.png")
         }
-        return {key: ImageTk.PhotoImage(img.resize((width, height))) 
+        return {key: ImageTk.PhotoImage(img.resize((width, height)))
                 for key, img in images.items()}
 
-    def _initialize_grid(self, cell_width, cell_height):
-        for row in range(5):
-            cell_row = []
-            for col in range(5):
-                cell = GridCell(self.frame, width=cell_width, height=cell_height)
-                cell.frame.grid(row=row, column=col, padx=2, pady=2)
-                cell.frame.grid_propagate(False)
-                cell_row.append(cell)
-                self.cell_states[f"{col},{row}"] = {"type": 0, "text": ""}
-            self.cells.append(cell_row)
-
     def get_cell_type(self, x, y):
-        return self.cell_states[f"{x},{y}"]["type"]
-    
+        return int(self.cell_types[y, x])
+
     def update_cell(self, x, y, card_type, text=None):
-        cell = self.cells[y][x]
-        cell_state = self.cell_states[f"{x},{y}"]
-        
         if text is not None:
-            cell_state["text"] = text
-        cell_state["type"] = card_type
+            self.cell_texts[y][x] = text
+        self.cell_types[y, x] = card_type
         
         card_style = self.CARD_TYPES[card_type]
-        cell.reset_appearance()
-        
         if card_style["type"] == "color":
-            cell.set_color_background(card_style["value"])
+            label = self.cell_texts[y][x].upper() if card_type == 0 else ""
+            self.board.set_cell(x, y, card_style["value"], text=label)
         else:
-            cell.set_image_background(card_style["value"])
-        
-        if card_type == 0 and cell_state["text"]:
-            cell.set_text(cell_state["text"].upper())
-
-class GridCell:
-    def __init__(self, parent, width, height):
-        self.frame = tk.Frame(
-            parent,
-            width=width,
-            height=height,
-            bg='white',
-            relief='solid',
-            borderwidth=1
-        )
-        
-        self.label = tk.Label(
-            self.frame,
-            text="",
-            wraplength=width-20,
-            justify='center',
-            bg='white',
-            font=('Arial', 12, 'bold')
-        )
-        self.label.place(relx=0.5, rely=0.5, anchor='center')
-    
-    def set_color_background(self, color):
-        self.frame.configure(bg=color)
-        self.label.configure(bg=color)
-    
-    def set_image_background(self, image):
-        self.label.configure(image=image)
-        self.label.place(relx=0, rely=0, relwidth=1, relheight=1, anchor='nw')
-    
-    def set_text(self, text, color='black'):
-        self.label.configure(text=text, fg=color)
-    
-    def reset_appearance(self):
-        self.label.configure(image='', text='')
-        self.label.place(relx=0.5, rely=0.5, anchor='center')
+            self.board.set_cell(x, y, 'white', image=card_style["value"])
 
 class KeyGrid:
     TEAM_COLORS = {
@@ -116,34 +137,14 @@ class KeyGrid:
         self.title = tk.Label(self.frame, text="Key Grid", font=('Arial', 12, 'bold'))
         self.title.pack(pady=(0, 5))
         
-        self.grid_frame = tk.Frame(self.frame)
-        self.grid_frame.pack()
-        
         cell_width, cell_height = 90, 60
-        self.cells = self._create_key_grid(cell_width, cell_height)
-    
-    def _create_key_grid(self, cell_width, cell_height):
-        cells = []
-        for row in range(5):
-            cell_row = []
-            for col in range(5):
-                cell = GridCell(self.grid_frame, width=cell_width, height=cell_height)
-                cell.frame.grid(row=row, column=col, padx=1, pady=1)
-                cell.frame.grid_propagate(False)
-                cell_row.append(cell)
-            cells.append(cell_row)
-        return cells
-    
+        self.board = BoardCanvas(self.frame, cell_width, cell_height, 1, ('Arial', 14, 'bold'))
+        self.board.canvas.pack()
+
     def update_cell(self, x, y, cell_type):
         if not (0 <= x < 5 and 0 <= y < 5):
             return
-            
-        cell = self.cells[y][x]
-        color = self.TEAM_COLORS[cell_type]
-        
-        cell.reset_appearance()
-        cell.set_color_background(color)
         
         # Set indicator text color based on background
         text_color = 'white' if cell_type in [0, 1, 2] else 'black'
-        cell.label.configure(fg=text_color, font=('Arial', 14, 'bold'))
\ No newline at end of file
+        self.board.set_cell(x, y, self.TEAM_COLORS[cell_type], text_color=text_color)
@@ -1,44 +1,168 @@
 import cv2
-from ultralytics import YOLO
 import numpy as np
+from backends import load_model
+from metrics import metrics
 
-class GridDetector:
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
+def extract_boxes(prediction):
+    """
+    Returns the boxes of one model prediction as an (n, 6) float32 array of
+    center_x, center_y, width, height, confidence and class.
+    """
+    detected_boxes = prediction.boxes
+    if detected_boxes is None or len(detected_boxes) == 0:
+        return np.zeros((0, 6), dtype=np.float32)
     
-    def process_image(self, game_image):
-        model_predictions = self.model(game_image)
-        card_detections = []
+    return np.column_stack((
+        detected_boxes.xywh.cpu().numpy(),
+        detected_boxes.conf.cpu().numpy(),
+        detected_boxes.cls.cpu().numpy()
+    )).astype(np.float32)
+
+def boxes_to_detections(boxes, image_shape):
+    """
+    Maps an (n, 6) box array onto the 5x5 grid of an image of the given shape.
+    """
+    image_height, image_width = image_shape[:2]
+    card_detections = []
+    
+    for center_x, center_y, box_width, box_height, confidence, card_class in boxes.tolist():
+        # Convert to grid coordinates (5x5 grid)
+        grid_position_x = int((center_x / image_width) * 5)
+        grid_position_y = int((center_y / image_height) * 5)
         
-        for prediction_batch in model_predictions:
-            image_height, image_width = prediction_batch.orig_img.shape[:2]
-            detected_boxes = prediction_batch.boxes
-            
-            for detected_box in detected_boxes:
-                # Extract center coordinates and dimensions
-                center_x = detected_box.xywh[0][0].item()
-                center_y = detected_box.xywh[0][1].item()
-                box_width = detected_box.xywh[0][2].item()
-                box_height = detected_box.xywh[0][3].item()
-                
-                # Convert to grid coordinates (5x5 grid)
-                grid_position_x = int((center_x / image_width) * 5)
-                grid_position_y = int((center_y / image_height) * 5)
-                card_class = int(detected_box.cls[0].item())
-                
-                # Only add valid grid positions
-                if 0 <= grid_position_x < 5 and 0 <= grid_position_y < 5:
-                    card_detections.append({
-                        'grid_x': grid_position_x,
-                        'grid_y': grid_position_y,
-                        'class': card_class,
-                    })
+        # Only add valid grid positions
+        if 0 <= grid_position_x < 5 and 0 <= grid_position_y < 5:
+            card_detections.append({
+                'grid_x': grid_position_x,
+                'grid_y': grid_position_y,
+                'class': int(card_class),
+                'confidence': confidence,
+                'bbox': [
+                    center_x - box_width / 2,
+                    center_y - box_height / 2,
+                    center_x + box_width / 2,
+                    center_y + box_height / 2
+                ]
+            })
+    
+    return card_detections
+
+def cluster_axis(coordinates, sizes, count=5):
+    """
+    Assigns coordinates along one axis to count evenly spaced rows (or
+    columns). The sorted coordinates are split wherever the gap exceeds half
+    a card, and the groups are placed on the grid by their spacing, so
+    missing cards do not shift the others. O(n log n) for the sort.
+    Returns an int array of indices, -1 for positions outside the grid.
+    """
+    if len(coordinates) == 0:
+        return np.zeros(0, dtype=np.intp)
+    
+    order = np.argsort(coordinates)
+    sorted_coordinates = coordinates[order]
+    min_gap = float(np.median(sizes)) / 2
+    group_ids = np.concatenate(([0], np.cumsum(np.diff(sorted_coordinates) > min_gap)))
+    group_centers = np.bincount(group_ids, weights=sorted_coordinates) / np.bincount(group_ids)
+    
+    if len(group_centers) == count or len(group_centers) == 1:
+        group_indices = np.arange(len(group_centers))
+    else:
+        # Whole rows missing: the smallest spacing between groups is one row
+        pitch = float(np.diff(group_centers).min())
+        group_indices = np.rint((group_centers - group_centers[0]) / pitch).astype(np.intp)
+    group_indices[group_indices >= count] = -1
+    
+    indices = np.empty(len(coordinates), dtype=np.intp)
+    indices[order] = group_indices[group_ids]
+    return indices
+
+def grid_angle(centers):
+    """
+    Estimates the rotation of a grid of (n, 2) centers in radians, within
+    [-45, 45) degrees, from the directions to each center's nearest
+    neighbour. Directions are averaged on a circle with a period of 90
+    degrees, so neighbours along rows and columns agree, and weighted by
+    length since the farther ones are less affected by box jitter.
+    O(n^2) over all pairs, a few hundred distances for a 25-box key card.
+    """
+    if len(centers) < 2:
+        return 0.0
+    
+    offsets = centers[None, :, :] - centers[:, None, :]
+    distances = np.linalg.norm(offsets, axis=2)
+    np.fill_diagonal(distances, np.inf)
+    nearest_offsets = offsets[np.arange(len(centers)), distances.argmin(axis=1)]
+    angles = np.arctan2(nearest_offsets[:, 1], nearest_offsets[:, 0])
+    lengths = np.linalg.norm(nearest_offsets, axis=1)
+    return float(np.arctan2((lengths * np.sin(4 * angles)).sum(), (lengths * np.cos(4 * angles)).sum()) / 4)
+
+def key_positions_to_grid(positions):
+    """
+    Builds the 5x5 key grid from an (n, 6) array of center_x, center_y,
+    width, height, confidence and team class. Cells without a detection
+    stay neutral (3); when two detections fall in one cell the more
+    confident one wins. Raises ValueError when the detections do not reach
+    all five rows and columns, since a missing edge row or column would
+    shift every other card by one cell.
+    """
+    # Initialize 5x5 grid with neutral positions (3)
+    key_position_grid = np.full((5, 5), 3, dtype=np.intp)
+    
+    # Undo any rotation of the card first, a tilted row would otherwise
+    # spread across the gap to the next one
+    angle = grid_angle(positions[:, :2])
+    cos_angle, sin_angle = np.cos(angle), np.sin(angle)
+    aligned_x = positions[:, 0] * cos_angle + positions[:, 1] * sin_angle
+    aligned_y = positions[:, 1] * cos_angle - positions[:, 0] * sin_angle
+    
+    rows = cluster_axis(aligned_y, positions[:, 3])
+    cols = cluster_axis(aligned_x, positions[:, 2])
+    if len(positions) == 0 or rows.max() < 4 or cols.max() < 4:
+        raise ValueError("Key grid detections do not cover all 5 rows and columns")
+    
+    # Least confident first, so the most confident detection is written last
+    by_confidence = np.argsort(positions[:, 4], kind='stable')
+    on_grid = by_confidence[(rows[by_confidence] >= 0) & (cols[by_confidence] >= 0)]
+    key_position_grid[rows[on_grid], cols[on_grid]] = positions[on_grid, 5].astype(np.intp)
+    
+    return key_position_grid.tolist()
+
+class GridDetector:
+    def __init__(self, model_path, backend="pytorch", int8=False):
+        self.model = load_model(model_path, backend, int8)
+    
+    def predict(self, game_images, imgsz=None):
+        """
+        Runs the model once over a list of images and returns one box array
+        per image, in the same order. imgsz overrides the model input size.
+        """
+        if not game_images:
+            return []
         
-        return card_detections
+        options = {'verbose': False}
+        if imgsz is not None:
+            options['imgsz'] = imgsz
+        with metrics.timer("yolo"):
+            model_predictions = self.model(list(game_images), **options)
+        metrics.increment("inference_images", len(game_images))
+        return [extract_boxes(prediction_batch) for prediction_batch in model_predictions]
+    
+    def process_image(self, game_image):
+        return self.process_batch([game_image])[0]
+    
+    def process_batch(self, game_images, imgsz=None):
+        """
+        Batched version of process_image: one model call for all images,
+        detections split back out per image.
+        """
+        return [
+            boxes_to_detections(boxes, game_image.shape)
+            for game_image, boxes in zip(game_images, self.predict(game_images, imgsz))
+        ]
     
 class KeyDetector:
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path, backend="pytorch", int8=False):
+        self.model = load_model(model_path, backend, int8)
         self.team_class_mapping = {
             'red': 0,     # Red agent
             'blue': 1,    # Blue agent
@@ -52,52 +176,35 @@ class KeyDetector:
         if key_image is None:
             raise ValueError("Could not read key image file")
         
+        return self.process_key_array(key_image)
+    
+    def process_key_array(self, key_image):
+        """
+        Same as process_key_image for an already decoded BGR image.
+        """
+        with metrics.timer("key_image"):
+            return self._process_key_image(key_image)
+    
+    def _process_key_image(self, key_image):
         # Get model predictions for key image
-        model_predictions = self.model(key_image)
-        
-        # Initialize 5x5 grid with neutral positions (3)
-        key_position_grid = [[3 for _ in range(5)] for _ in range(5)]
+        with metrics.timer("key_detection"):
+            model_predictions = self.model(key_image, verbose=False)
         
         # Collect all valid key positions
         valid_key_positions = []
         for prediction_batch in model_predictions:
-            detected_boxes = prediction_batch.boxes
-            for detected_box in detected_boxes:
-                class_index = int(detected_box.cls[0])
-                class_name = self.model.names[class_index]
-                confidence_score = float(detected_box.conf[0])
+            for center_x, center_y, box_width, box_height, confidence_score, class_index in extract_boxes(prediction_batch).tolist():
+                class_name = self.model.names[int(class_index)]
                 
                 # Only process valid team colors with high confidence
                 if class_name in self.team_class_mapping and confidence_score > 0.5:
-                    position_x, position_y = detected_box.xywh[0][:2]
                     valid_key_positions.append((
-                        float(position_x),
-                        float(position_y),
-                        class_name,
-                        confidence_score
+                        center_x,
+                        center_y,
+                        box_width,
+                        box_height,
+                        confidence_score,
+                        self.team_class_mapping[class_name]
                     ))
         
-        # Sort positions by vertical coordinate (rows)
-        valid_key_positions.sort(key=lambda pos: pos[1])
-        
-        # Split into 5 rows
-        row_positions = [[] for _ in range(5)]
-        positions_per_row = len(valid_key_positions) // 5
-        
-        # Distribute positions into rows
-        for position_index, key_position in enumerate(valid_key_positions):
-            row_index = position_index // positions_per_row
-            if row_index < 5:  # Ensure we don't exceed grid size
-                row_positions[row_index].append(key_position)
-        
-        # Process each row and assign team colors
-        for row_index, row_key_positions in enumerate(row_positions):
-            # Sort positions in row by horizontal coordinate
-            row_key_positions.sort(key=lambda pos: pos[0])
-            
-            # Assign team colors to grid positions
-            for col_index, (_, _, team_color, _) in enumerate(row_key_positions):
-                if col_index < 5:  # Ensure we don't exceed grid size
-                    key_position_grid[row_index][col_index] = self.team_class_mapping[team_color]
-        
-        return key_position_grid
\ No newline at end of file
+        return key_positions_to_grid(np.array(valid_key_positions, dtype=np.float32).reshape(-1, 6))